@@ -0,0 +1,102 @@
+"""
+
+    benchmarks.ascii_fast_path
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Speed of :func:`webencodings.decode` and :func:`webencodings.iter_decode`
+    on HTML that is mostly ASCII, compared to decoding with the codec
+    directly, for each ASCII-compatible encoding::
+
+        python benchmarks/ascii_fast_path.py
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webencodings  # noqa
+
+
+# Markup, scripts and URLs are ASCII whatever the encoding.
+MARKUP = ('<div class="item"><a href="/articles/2012/05/page.html?id=%d">'
+          '<img src="/static/thumb.png" alt=""></a>'
+          '<script>window.track && track("view", 42);</script></div>\n')
+# Followed by some text in the language of the page.
+TEXT = {
+    'windows-1252': 'Caf\xe9 na\xefve r\xe9sum\xe9.',
+    'windows-1251': 'Привет мир.',
+    'koi8-r': 'Привет мир.',
+    'iso-8859-2': 'Zaż\xf3łć gęślą jaźń.',
+    'shift_jis': '日本語のテキスト。',
+    'euc-jp': '日本語のテキスト。',
+    'euc-kr': '한국어 텍스트.',
+    'gbk': '中文文本。',
+    'gb18030': '中文文本。',
+    'big5': '中文文本。',
+}
+
+
+def document(label, markup_per_text):
+    """Return an encoded HTML document of about 4 MB."""
+    parts = []
+    for i in range(20000):
+        parts.append(MARKUP % i)
+        if markup_per_text and i % markup_per_text == 0:
+            parts.append('<p>%s</p>\n' % TEXT[label])
+    return ''.join(parts).encode(label)
+
+
+def chunks(data, size=4096):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def codec_iter_decode(chunks, label):
+    decode = webencodings.lookup(label).codec_info.incrementaldecoder(
+        'replace').decode
+    for chunk in chunks:
+        decode(chunk)
+    decode(b'', True)
+
+
+def webencodings_iter_decode(chunks, label):
+    for _output in webencodings.iter_decode(chunks, label)[0]:
+        pass
+
+
+def best(function):
+    return min(timeit.repeat(function, number=3, repeat=7)) / 3
+
+
+def report(label, description, size, before, after):
+    print('%-13s %-32s %10.0f %10.0f %7.1fx' % (
+        label, description, size / before / 1e6, size / after / 1e6,
+        before / after))
+
+
+def main():
+    print('%-13s %-32s %10s %10s %8s' % (
+        'encoding', 'benchmark', 'codec MB/s', 'MB/s', 'speedup'))
+    for label in sorted(TEXT):
+        codec_decode = webencodings.lookup(label).codec_info.decode
+        for description, markup_per_text in [
+                ('all ASCII', None), ('text every 100 tags', 100),
+                ('text every 10 tags', 10)]:
+            data = document(label, markup_per_text)
+            before = best(lambda: codec_decode(data, 'replace'))
+            after = best(lambda: webencodings.decode(data, label))
+            report(label, 'decode, ' + description, len(data), before, after)
+            split = chunks(data)
+            before = best(lambda: codec_iter_decode(split, label))
+            after = best(lambda: webencodings_iter_decode(split, label))
+            report(label, 'iter_decode, ' + description, len(data),
+                   before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+
+    benchmarks.charmap_decode
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Speed of the table-driven codecs of :mod:`webencodings.single_byte`
+    compared to the Python codecs for the same encodings::
+
+        python benchmarks/charmap_decode.py
+
+    The tables are built from the Python codecs,
+    so this measures the codec machinery rather than the data.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import codecs
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webencodings  # noqa
+from webencodings import single_byte  # noqa
+
+
+NAMES = [
+    'ibm866', 'iso-8859-2', 'iso-8859-5', 'iso-8859-7', 'koi8-r',
+    'macintosh', 'windows-874', 'windows-1251', 'windows-1252',
+    'x-mac-cyrillic']
+
+
+def python_codec(name):
+    return codecs.lookup(webencodings.PYTHON_NAMES.get(name, name))
+
+
+def table_from(codec_info):
+    """Decoding table of a Python codec, with U+FFFE for unmapped bytes."""
+    return ''.join(
+        codec_info.decode(bytes(bytearray([byte])), 'ignore')[0] or '\ufffe'
+        for byte in range(256))
+
+
+def best(function):
+    return min(timeit.repeat(function, number=3, repeat=7)) / 3
+
+
+def main():
+    rng = random.Random(0)
+    print('%-15s %12s %12s %12s %12s' % (
+        'encoding', 'decode MB/s', 'python MB/s', 'encode MB/s',
+        'python MB/s'))
+    for name in NAMES:
+        python = python_codec(name)
+        table = table_from(python)
+        codec_info = single_byte.codec_info(name, table)
+        mapped = [char for char in table if char != '\ufffe']
+        text = ''.join(rng.choice(mapped) for _ in range(1 << 20)) * 4
+        data = python.encode(text)[0]
+        size = len(data) / 1e6
+        print('%-15s %12.0f %12.0f %12.0f %12.0f' % (
+            name,
+            size / best(lambda: codec_info.decode(data)),
+            size / best(lambda: python.decode(data)),
+            size / best(lambda: codec_info.encode(text)),
+            size / best(lambda: python.encode(text))))
+
+
+if __name__ == '__main__':
+    main()
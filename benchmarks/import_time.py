@@ -0,0 +1,63 @@
+"""
+
+    benchmarks.import_time
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Measure the cold import time of webencodings, and fail if it exceeds
+    a budget::
+
+        python benchmarks/import_time.py [--budget MILLISECONDS]
+
+    Every sample is a fresh interpreter run with ``-X importtime``
+    (Python 3.7+). The best sample is compared to the budget,
+    so that noise from other processes does not cause spurious failures.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Default budget for ``import webencodings``, in milliseconds.
+BUDGET = 5.0
+
+
+def sample(module='webencodings'):
+    """Return the cumulative import time of `module`, in milliseconds."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.STDOUT, env=env, cwd=ROOT)
+    for line in output.decode('utf8').splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000.
+    raise ValueError('No import time reported for %s' % module)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Cold import time of webencodings.')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help='milliseconds, default: %(default)s')
+    parser.add_argument('--samples', type=int, default=20)
+    args = parser.parse_args()
+    sample()  # Make sure .pyc files are written.
+    best = min(sample() for _ in range(args.samples))
+    print('import webencodings: %.2f ms (budget: %.2f ms)'
+          % (best, args.budget))
+    if best > args.budget:
+        print('FAIL: import time is over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+
+    benchmarks.iter_decode_batching
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Throughput of :func:`webencodings.iter_decode` on streams of small reads,
+    with and without ``batch_size``::
+
+        python benchmarks/iter_decode_batching.py
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webencodings  # noqa
+
+
+HTML = ('<p class="item">Caf\xe9 na\xefve r\xe9sum\xe9 '
+        '日本語 &amp; more text</p>\n')
+
+
+def small_reads(data, seed=0):
+    """Split `data` in 1 to 4 KiB chunks, like network reads."""
+    rng = random.Random(seed)
+    chunks = []
+    position = 0
+    while position < len(data):
+        size = rng.randint(1024, 4096)
+        chunks.append(data[position:position + size])
+        position += size
+    return chunks
+
+
+def consume(chunks, label, batch_size):
+    output, _encoding = webencodings.iter_decode(
+        chunks, label, batch_size=batch_size)
+    length = 0
+    for text in output:  # A minimal downstream consumer.
+        length += len(text)
+    return length
+
+
+def main():
+    for label in ['utf-8', 'windows-1252', 'shift_jis']:
+        data = (HTML * 100000).encode(label, 'replace')
+        chunks = small_reads(data)
+        for batch_size in [None, 16384, 65536, 262144]:
+            best = min(timeit.repeat(
+                lambda: consume(chunks, label, batch_size),
+                number=1, repeat=5))
+            print('%-12s batch_size=%-7s %7.1f MB/s' % (
+                label, batch_size, len(data) / best / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+
+    benchmarks.suite
+    ~~~~~~~~~~~~~~~~
+
+    Benchmarks for :func:`webencodings.lookup`, :func:`webencodings.decode`,
+    :func:`webencodings.iter_decode` and
+    :class:`webencodings.IncrementalDecoder`, each next to a baseline that
+    uses the Python codec directly so that the overhead of webencodings
+    is visible::
+
+        python benchmarks/suite.py run [--output results.json]
+        python benchmarks/suite.py compare old.json new.json
+
+    ``run`` uses a reproducible synthetic corpus for every encoding in
+    :data:`webencodings.LABELS`: ASCII-heavy HTML, CJK text for encodings
+    that support it and input with a BOM for UTF-8 and UTF-16,
+    read in chunks from 1 byte to 1 MiB for the incremental benchmarks.
+    For each benchmark it records the best time, throughput, time per call
+    and peak memory (with :mod:`tracemalloc`), for webencodings and for the
+    baseline.
+
+    ``compare`` prints the benchmarks that are slower or use more memory
+    in the second run than in the first by more than a threshold,
+    and exits with status 1 if there are any.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import argparse
+import codecs
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webencodings  # noqa
+
+
+#: Chunk sizes for the incremental benchmarks, in bytes.
+CHUNK_SIZES = [1, 64, 4096, 65536, 1 << 20]
+
+#: Chunks smaller than this only read the start of the input,
+#: to keep the number of calls reasonable.
+SMALL_CHUNK_SIZE = 4096
+SMALL_CHUNK_INPUT = 16384
+
+# Non-ASCII characters for the text of HTML pages. Each encoding uses
+# those it can encode, which is typically one or two scripts.
+TEXT_CHARACTERS = (
+    'àáâãäåæçèéêëìíîïñòóôõöøùúûüýÿœšžčćđłńőűąęğışţăřůėųāēīūŵŷ'
+    'αβγδεζηθικλμνξοπρστυφχψω'
+    'абвгдежзийклмнопрстуфхцчшщъыьэюяёєіїўґ'
+    'אבגדהוזחטיכלמנסעפצקרשת'
+    'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+    'กขคงจฉชซญดตถทนบปผพฟภมยรลวศษสหอฮ'
+    '€‘’“”–—…•™')
+# Characters for CJK text.
+CJK_CHARACTERS = (
+    'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよ'
+    'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモ'
+    '日本語中文字漢國人大小上下年月時間學生會社電話新聞東京北京'
+    '한국어가나다라마바사아자차카타파하')
+
+
+def encodable(characters, codec_info):
+    """Return the characters that `codec_info` can encode."""
+    result = []
+    for character in characters:
+        try:
+            codec_info.encode(character)
+        except UnicodeEncodeError:
+            continue
+        result.append(character)
+    return result
+
+
+def html(name, size, seed=0):
+    """Return ASCII-heavy HTML of about `size` bytes, as a Unicode string."""
+    rng = random.Random(seed)
+    characters = encodable(
+        TEXT_CHARACTERS, webencodings.lookup(name).codec_info)
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'web', 'page']
+    parts = ['<!DOCTYPE html>\n<html><head><title>Page</title></head><body>\n']
+    length = 0
+    while length < size:
+        part = ('<div class="item" id="item-%d"><a href="/path/%d.html">'
+                % (length, rng.randint(0, 99999)))
+        text = []
+        for _ in range(rng.randint(3, 12)):
+            if characters and rng.random() < 0.3:
+                text.append(''.join(
+                    rng.choice(characters) for _ in range(rng.randint(2, 8))))
+            else:
+                text.append(rng.choice(words))
+        part += ' '.join(text) + '</a></div>\n'
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def cjk(name, size, seed=0):
+    """Return CJK text of about `size` characters, or None if `name` cannot
+    encode most of it.
+
+    """
+    characters = encodable(
+        CJK_CHARACTERS, webencodings.lookup(name).codec_info)
+    if len(characters) < len(CJK_CHARACTERS) // 2:
+        return None
+    rng = random.Random(seed)
+    parts = []
+    for i in range(size):
+        parts.append(rng.choice(characters))
+        if i % 40 == 39:
+            parts.append('。\n' if '。' in characters else '.\n')
+    return ''.join(parts)
+
+
+def corpus(name, size):
+    """Yield ``(kind, bytes)`` inputs for the encoding `name`."""
+    encode = webencodings.lookup(name).codec_info.encode
+    text = html(name, size)
+    data = encode(text)[0]
+    yield 'html', data
+    text = cjk(name, size // 3)
+    if text is not None:
+        yield 'cjk', encode(text)[0]
+    bom = {'utf-8': codecs.BOM_UTF8, 'utf-16le': codecs.BOM_UTF16_LE,
+           'utf-16be': codecs.BOM_UTF16_BE}.get(name)
+    if bom is not None:
+        yield 'html-bom', bom + data
+
+
+def chunks(data, chunk_size):
+    if chunk_size < SMALL_CHUNK_SIZE:
+        data = data[:SMALL_CHUNK_INPUT]
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def consume(output):
+    """Consume an iterable of strings without keeping them."""
+    length = 0
+    for text in output:
+        length += len(text)
+    return length
+
+
+def iter_decode(chunks, name):
+    output, _encoding = webencodings.iter_decode(chunks, name)
+    return consume(output)
+
+
+def baseline_iter_decode(chunks, codec_info):
+    decoder = codec_info.incrementaldecoder('replace')
+    return consume(decoder.decode(chunk) for chunk in chunks) + len(
+        decoder.decode(b'', True))
+
+
+def incremental_decode(chunks, name):
+    decode = webencodings.IncrementalDecoder(name).decode
+    length = 0
+    for chunk in chunks:
+        length += len(decode(chunk))
+    return length + len(decode(b'', True))
+
+
+def baseline_incremental_decode(chunks, codec_info):
+    decode = codec_info.incrementaldecoder('replace').decode
+    length = 0
+    for chunk in chunks:
+        length += len(decode(chunk))
+    return length + len(decode(b'', True))
+
+
+def cases(names, size):
+    """Yield ``(key, function, baseline, calls, input_size)`` tuples.
+
+    :obj:`key` is a dict identifying the benchmark,
+    :obj:`baseline` is :obj:`None` when there is no equivalent codec call.
+
+    """
+    for name in names:
+        codec_info = webencodings.lookup(name).codec_info
+        python_name = webencodings.PYTHON_NAMES.get(name, name)
+        try:
+            codecs.lookup(python_name)
+        except LookupError:  # x-user-defined
+            python_name = None
+        label = ' %s ' % name.upper()
+        yield (
+            dict(benchmark='lookup', encoding=name, input='label'),
+            lambda label=label: webencodings.lookup(label),
+            python_name and (
+                lambda python_name=python_name: codecs.lookup(python_name)),
+            1, None)
+
+        for kind, data in corpus(name, size):
+            yield (
+                dict(benchmark='decode', encoding=name, input=kind),
+                lambda data=data, name=name: webencodings.decode(data, name),
+                lambda data=data, codec_info=codec_info: codec_info.decode(
+                    data, 'replace'),
+                1, len(data))
+            small = data[:64]
+            yield (
+                dict(benchmark='decode', encoding=name, input=kind + '-64'),
+                lambda small=small, name=name: webencodings.decode(
+                    small, name),
+                lambda small=small, codec_info=codec_info: codec_info.decode(
+                    small, 'replace'),
+                1, len(small))
+            for chunk_size in CHUNK_SIZES:
+                split = chunks(data, chunk_size)
+                input_size = sum(len(chunk) for chunk in split)
+                for benchmark, function, baseline in [
+                        ('iter_decode', iter_decode, baseline_iter_decode),
+                        ('IncrementalDecoder', incremental_decode,
+                         baseline_incremental_decode)]:
+                    yield (
+                        dict(benchmark=benchmark, encoding=name, input=kind,
+                             chunk_size=chunk_size),
+                        lambda function=function, split=split, name=name:
+                            function(split, name),
+                        lambda baseline=baseline, split=split,
+                        codec_info=codec_info: baseline(split, codec_info),
+                        len(split), input_size)
+
+
+def timing(function, repeat):
+    """Return the best time of one run of `function`, in seconds."""
+    # Run small functions in loops of at least 10 ms.
+    number = 1
+    while True:
+        time = timeit.timeit(function, number=number)
+        if time >= 0.01:
+            break
+        number *= 10
+    return min([time] + timeit.repeat(
+        function, number=number, repeat=repeat - 1)) / number
+
+
+def peak_memory(function):
+    """Return the peak memory allocated while `function` runs, in bytes."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(function, calls, input_size, repeat):
+    seconds = timing(function, repeat)
+    result = dict(seconds=seconds, per_call=seconds / calls,
+                  peak_memory=peak_memory(function))
+    if input_size:
+        result['mb_per_s'] = input_size / seconds / 1e6
+    return result
+
+
+def run(names, size, repeat, verbose=True):
+    results = []
+    for key, function, baseline, calls, input_size in cases(names, size):
+        result = dict(key, webencodings=measure(
+            function, calls, input_size, repeat))
+        if baseline is not None:
+            result['baseline'] = measure(baseline, calls, input_size, repeat)
+            result['overhead'] = (result['webencodings']['seconds'] /
+                                  result['baseline']['seconds'])
+        if verbose:
+            print('%-18s %-14s %-12s %8s %10.2f us %9s %s' % (
+                key['benchmark'], key['encoding'], key['input'],
+                key.get('chunk_size', ''),
+                result['webencodings']['per_call'] * 1e6,
+                '%.0f MB/s' % result['webencodings']['mb_per_s']
+                if input_size else '',
+                'x%.2f' % result['overhead'] if baseline else ''))
+        results.append(result)
+    return dict(
+        python=sys.version.split()[0],
+        implementation=platform.python_implementation(),
+        webencodings=webencodings.VERSION,
+        size=size,
+        results=results)
+
+
+def key(result):
+    return (result['benchmark'], result['encoding'], result['input'],
+            result.get('chunk_size'))
+
+
+def compare(old, new, threshold):
+    """Return a list of messages for regressions from `old` to `new`."""
+    old_results = dict((key(result), result) for result in old['results'])
+    regressions = []
+    for result in new['results']:
+        old_result = old_results.get(key(result))
+        if old_result is None:
+            continue
+        for metric in ['seconds', 'peak_memory']:
+            before = old_result['webencodings'][metric]
+            after = result['webencodings'][metric]
+            if before and after > before * (1 + threshold):
+                regressions.append('%s: %s %.3g -> %.3g (+%.0f%%)' % (
+                    ' '.join(str(part) for part in key(result)
+                             if part is not None),
+                    metric, before, after, (after / before - 1) * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='webencodings benchmarks.')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--output', help='JSON file for the results')
+    run_parser.add_argument(
+        '--encodings', nargs='+', metavar='NAME',
+        default=sorted(set(webencodings.LABELS.values())),
+        help='default: every encoding in LABELS')
+    run_parser.add_argument(
+        '--size', type=int, default=128 * 1024,
+        help='approximate size of each input, default: %(default)s')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    compare_parser = subparsers.add_parser(
+        'compare', help='find regressions between two runs')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='relative increase that is a regression, '
+             'default: %(default)s')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.encodings, args.size, args.repeat)
+        if args.output:
+            with open(args.output, 'w') as fd:
+                json.dump(results, fd, indent=1, sort_keys=True)
+    elif args.command == 'compare':
+        with open(args.old) as fd:
+            old = json.load(fd)
+        with open(args.new) as fd:
+            new = json.load(fd)
+        regressions = compare(old, new, args.threshold)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            sys.exit(1)
+        print('No regressions.')
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
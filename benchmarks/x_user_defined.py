@@ -0,0 +1,62 @@
+"""
+
+    benchmarks.x_user_defined
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Speed of :func:`webencodings.decode` and of the x-user-defined
+    codec's encoder compared to plain :func:`codecs.charmap_decode` and
+    :func:`codecs.charmap_encode` with its tables, on 4 MB inputs::
+
+        python benchmarks/x_user_defined.py
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import codecs
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webencodings import decode, x_user_defined  # noqa
+
+
+SIZE = 4 << 20
+
+
+def inputs():
+    rng = random.Random(0)
+    yield 'binary', bytes(bytearray(rng.getrandbits(8) for _ in range(SIZE)))
+    text = bytearray(rng.choice(b'abcdefghij <>/="\n') for _ in range(SIZE))
+    yield 'all ASCII', bytes(text)
+    for i in range(500, SIZE, 1000):
+        text[i] = 0xE9
+    yield 'mostly ASCII', bytes(text)
+
+
+def best(function):
+    return min(timeit.repeat(function, number=3, repeat=7)) / 3
+
+
+def main():
+    codec_info = x_user_defined.codec_info
+    print('%-13s %16s %13s %16s %13s' % (
+        'input', 'charmap decode', 'decode', 'charmap encode', 'encode'))
+    for description, data in inputs():
+        text = codec_info.decode(data)[0]
+        print('%-13s %11.0f MB/s %8.0f MB/s %11.0f MB/s %8.0f MB/s' % (
+            description,
+            SIZE / 1e6 / best(lambda: codecs.charmap_decode(
+                data, 'strict', x_user_defined.decoding_table)),
+            SIZE / 1e6 / best(lambda: decode(data, 'x-user-defined')),
+            SIZE / 1e6 / best(lambda: codecs.charmap_encode(
+                text, 'strict', x_user_defined.encoding_table)),
+            SIZE / 1e6 / best(lambda: codec_info.encode(text))))
+
+
+if __name__ == '__main__':
+    main()
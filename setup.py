@@ -1,7 +1,9 @@
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 import io
 from os import path
 import re
+import sys
 
 
 VERSION = re.search("VERSION = '([^']+)'", io.open(
@@ -15,6 +17,18 @@ LONG_DESCRIPTION = io.open(
 ).read()
 
 
+class BuildPy(build_py):
+    """Leave out webencodings.aio, that is a syntax error before Python 3.6.
+
+    """
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 6):
+            modules = [module for module in modules
+                       if module[:2] != ('webencodings', 'aio')]
+        return modules
+
+
 setup(
     name='webencodings',
     version=VERSION,
@@ -26,13 +40,14 @@ setup(
     maintainer_email='me@gsnedders.com',
     description='Character encoding aliases for legacy web content',
     long_description=LONG_DESCRIPTION,
+    # memoryview is new in Python 2.7.
+    python_requires='>=2.7, !=3.0.*, !=3.1.*, !=3.2.*',
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
@@ -44,4 +59,5 @@ setup(
         'Topic :: Internet :: WWW/HTTP',
     ],
     packages=find_packages(),
+    cmdclass={'build_py': BuildPy},
 )
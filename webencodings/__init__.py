@@ -15,22 +15,51 @@
 from __future__ import unicode_literals
 
 import codecs
+import errno
+import io
+import sys
 
-from .labels import LABELS
+try:
+    from _thread import allocate_lock, _local
+except ImportError:  # Python 2
+    from thread import allocate_lock, _local
 
+from .labels import (LABELS, BYTES_LABELS, ASCII_COMPATIBLE, SINGLE_BYTE,
+                     PYTHON_NAMES)
 
-VERSION = '0.6-dev'
 
+VERSION = '0.6-dev'
 
-# Some names in Encoding are not valid Python aliases. Remap these.
-PYTHON_NAMES = {
-    'iso-8859-8-i': 'iso-8859-8',
-    'x-mac-cyrillic': 'mac-cyrillic',
-    'macintosh': 'mac-roman',
-    'windows-874': 'cp874'}
 
 CACHE = {}
 
+#: Default size in bytes of the buffer used by :func:`iter_decode_file`.
+FILE_BUFFER_SIZE = 65536
+_CACHE_LOCK = allocate_lock()
+
+#: Maximum number of raw labels remembered by :func:`lookup`.
+LOOKUP_CACHE_SIZE = 1024
+
+# Raw label, exactly as passed to lookup() -> Encoding or None.
+_LOOKUP_CACHE = {}
+_lookup_cache_hits = 0
+_lookup_cache_misses = 0
+
+# The recorder of webencodings.metrics, or None when metrics are disabled.
+_metrics = None
+
+# Encodings that decode every ASCII byte to the same code point,
+# so that an all-ASCII input can go through the faster ASCII codec instead.
+# UTF-8 is not included: its codec already has an ASCII fast path.
+_ASCII_FAST_PATH = ASCII_COMPATIBLE - frozenset(['utf-8'])
+# Those of them where an ASCII byte can also be the second byte
+# of a multi-byte sequence started in a previous chunk.
+_ASCII_FAST_PATH_MULTIBYTE = _ASCII_FAST_PATH - SINGLE_BYTE
+
+# Named tuple type returned by lookup_cache_info(). Created on first use,
+# as importing collections is slow.
+_LookupCacheInfo = None
+
 
 def ascii_lower(string):
     r"""Transform (only) ASCII letters to lower case: A-Z is mapped to a-z.
@@ -65,29 +94,162 @@ def lookup(label):
     <http://encoding.spec.whatwg.org/#concept-encoding-get>`_ algorithm.
     Supported labels are listed there.
 
+    Results are remembered by raw label, before whitespace stripping and
+    case folding, so repeated lookups of the same string (including
+    unknown labels) cost a couple of dictionary operations.
+    At most :data:`LOOKUP_CACHE_SIZE` labels are remembered;
+    the least recently used ones are evicted first.
+    (Before Python 3.6, where dictionaries do not keep insertion order,
+    an arbitrary label is evicted instead.)
+    See :func:`lookup_cache_info`.
+
+    There is only ever one :class:`Encoding` object per encoding name,
+    even when :func:`lookup` is called concurrently from several threads,
+    so encodings can be compared with ``is``.
+    See also :func:`preload`.
+
     :param label: A string.
     :returns:
         An :class:`Encoding` object, or :obj:`None` for an unknown label.
 
     """
+    global _lookup_cache_hits, _lookup_cache_misses
+    try:
+        encoding = _LOOKUP_CACHE.pop(label)
+    except KeyError:
+        pass
+    else:
+        # Re-inserted last, so that it is evicted last.
+        _LOOKUP_CACHE[label] = encoding
+        _lookup_cache_hits += 1
+        if _metrics is not None:
+            _metrics.looked_up(encoding, None, cached=True)
+        return encoding
+    _lookup_cache_misses += 1
+    metrics = _metrics
+    if metrics is None:
+        encoding = _lookup(label)
+    else:
+        start = metrics.start()
+        encoding = _lookup(label)
+        metrics.looked_up(encoding, start)
+    if len(_LOOKUP_CACHE) >= LOOKUP_CACHE_SIZE:
+        try:
+            # The first label is the least recently used.
+            del _LOOKUP_CACHE[next(iter(_LOOKUP_CACHE))]
+        except (KeyError, StopIteration, RuntimeError):
+            pass  # Another thread evicted concurrently.
+    _LOOKUP_CACHE[label] = encoding
+    return encoding
+
+
+def _lookup(label):
+    """Uncached implementation of :func:`lookup`."""
     # Only strip ASCII whitespace: U+0009, U+000A, U+000C, U+000D, and U+0020.
     label = ascii_lower(label.strip('\t\n\f\r '))
     name = LABELS.get(label)
     if name is None:
         return None
+    return _encoding_from_name(name)
+
+
+def lookup_bytes(label):
+    """
+    Like :func:`lookup`, but for a label that is a byte string,
+    as found in HTTP headers or in a document before it is decoded.
+    Whitespace stripping and case folding are done directly on bytes,
+    without decoding the label first.
+
+    :param label: A byte string, :class:`bytearray` or :class:`memoryview`.
+    :returns:
+        An :class:`Encoding` object, or :obj:`None` for an unknown label.
+
+    """
+    if isinstance(label, memoryview):
+        label = label.tobytes()
+    elif not isinstance(label, bytes):
+        label = bytes(label)
+    # bytes.lower() only affects ASCII letters.
+    name = BYTES_LABELS.get(label.strip(b'\t\n\f\r ').lower())
+    if name is None:
+        return None
+    return _encoding_from_name(name)
+
+
+def _encoding_from_name(name):
+    """Return the cached :class:`Encoding` for a canonical name."""
     encoding = CACHE.get(name)
     if encoding is None:
-        if name == 'x-user-defined':
-            from .x_user_defined import codec_info
-        else:
-            python_name = PYTHON_NAMES.get(name, name)
-            # Any python_name value that gets to here should be valid.
-            codec_info = codecs.lookup(python_name)
-        encoding = Encoding(name, codec_info)
-        CACHE[name] = encoding
+        with _CACHE_LOCK:
+            # Check again: another thread may have won the race.
+            encoding = CACHE.get(name)
+            if encoding is None:
+                if name == 'x-user-defined':
+                    from .x_user_defined import codec_info
+                elif name == 'replacement':
+                    from .replacement import codec_info
+                elif name in SINGLE_BYTE:
+                    # From the WHATWG indexes: the Python codecs differ.
+                    from . import single_byte
+                    codec_info = single_byte.codec_info(name)
+                else:
+                    # Any PYTHON_NAMES value should be valid.
+                    codec_info = codecs.lookup(PYTHON_NAMES[name])
+                encoding = Encoding(name, codec_info)
+                CACHE[name] = encoding
     return encoding
 
 
+def preload(names=None):
+    """
+    Resolve encodings ahead of time rather than on first use,
+    for example before forking worker processes.
+
+    :param names:
+        An iterable of :class:`Encoding` objects or labels,
+        or :obj:`None` (the default) for every supported encoding.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+    """
+    if names is None:
+        # Canonical names, not labels: 'replacement' is not a label.
+        for name in set(LABELS.values()):
+            _encoding_from_name(name)
+    else:
+        for name in names:
+            _get_encoding(name)
+
+
+def lookup_cache_info():
+    """Return statistics about the raw label cache of :func:`lookup`.
+
+    :returns:
+        A ``LookupCacheInfo(hits, misses, maxsize, currsize)`` named tuple,
+        like :meth:`functools.lru_cache` does.
+
+    """
+    global _LookupCacheInfo
+    if _LookupCacheInfo is None:
+        from collections import namedtuple
+        _LookupCacheInfo = namedtuple(
+            'LookupCacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+    return _LookupCacheInfo(_lookup_cache_hits, _lookup_cache_misses,
+                            LOOKUP_CACHE_SIZE, len(_LOOKUP_CACHE))
+
+
+def lookup_cache_clear():
+    """Clear the raw label cache of :func:`lookup` and its statistics."""
+    global _lookup_cache_hits, _lookup_cache_misses
+    _LOOKUP_CACHE.clear()
+    _lookup_cache_hits = _lookup_cache_misses = 0
+
+
+def _set_metrics(recorder):
+    """Enable metrics with a recorder, or disable them with :obj:`None`."""
+    global _metrics
+    _metrics = recorder
+
+
 def _get_encoding(encoding_or_label):
     """
     Accept either an encoding object or label.
@@ -120,56 +282,314 @@ class Encoding(object):
         a stdlib :class:`~codecs.CodecInfo` object.
         See :func:`codecs.register`.
 
+    Encodings are pickled and copied by name,
+    as the same object from :func:`lookup`.
+
     """
+    __slots__ = ('name', 'codec_info', '_codec_decode', '_codec_encode')
+
     def __init__(self, name, codec_info):
         self.name = name
         self.codec_info = codec_info
+        self._codec_decode = codec_info.decode
+        self._codec_encode = codec_info.encode
 
     def __repr__(self):
         return '<Encoding %s>' % self.name
 
+    def __reduce__(self):
+        # A name, not a label: 'replacement' is not a label.
+        return _encoding_from_name, (self.name,)
 
-#: The UTF-8 encoding. Should be used for new content and formats.
-UTF8 = lookup('utf-8')
-
-_UTF16LE = lookup('utf-16le')
-_UTF16BE = lookup('utf-16be')
+    def decode(self, input, errors='replace', report=None):
+        """Like :func:`decode` with this encoding as the fallback encoding,
+        without looking it up.
 
-
-def decode(input, fallback_encoding, errors='replace'):
+        """
+        metrics = _metrics
+        if metrics is not None:
+            start = metrics.start()
+        bom_encoding, bom_length = _bom(_head(input))
+        if bom_length:
+            input = _skip(input, bom_length)
+        encoding = bom_encoding or self
+        output = None
+        if encoding.name in _ASCII_FAST_PATH:
+            output = _decode_ascii(input)
+        if output is None:
+            if report is None:
+                output = encoding._codec_decode(input, errors)[0]
+            else:
+                output = report._wrap(
+                    encoding._codec_decode, errors, bom_length)(
+                    input, _REPORT_ERRORS)[0]
+        if metrics is not None:
+            metrics.decoded(encoding, self, bom_encoding is not None,
+                            len(input), len(output), start)
+        return output, encoding
+
+    def encode(self, input, errors='strict'):
+        """Like :func:`encode` with this encoding, without looking it up."""
+        metrics = _metrics
+        if metrics is None:
+            return self._codec_encode(input, errors)[0]
+        start = metrics.start()
+        output = self._codec_encode(input, errors)[0]
+        metrics.encoded(self, len(input), len(output), start)
+        return output
+
+
+def __getattr__(name):
+    # Module constants are resolved on first access rather than at import
+    # time, to keep codecs.lookup() off the import path. See PEP 562.
+    if name == 'UTF8':
+        encoding = globals()['UTF8'] = lookup('utf-8')
+        return encoding
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+if sys.version_info < (3, 7):  # No module __getattr__ support.
+    #: The UTF-8 encoding. Should be used for new content and formats.
+    UTF8 = lookup('utf-8')
+
+
+def decode(input, fallback_encoding, errors='replace', report=None):
     """
     Decode a single string.
 
-    :param input: A byte string
+    :param input:
+        A byte string, or any object supporting the buffer protocol
+        such as :class:`bytearray`, :class:`memoryview` or :class:`mmap.mmap`.
+        The input is not copied, even when it starts with a BOM.
     :param fallback_encoding:
         An :class:`Encoding` object or a label string.
-        The encoding to use if :obj:`input` does note have a BOM.
+        The encoding to use if :obj:`input` does not have a BOM.
     :param errors: Type of error handling. See :func:`codecs.register`.
+    :param report:
+        A new :class:`DecodeReport` to fill with the malformed sequences
+        found in :obj:`input`, if any.
     :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
     :return:
         A ``(output, encoding)`` tuple of an Unicode string
         and an :obj:`Encoding`.
 
     """
-    # Fail early if `encoding` is an invalid label.
-    fallback_encoding = _get_encoding(fallback_encoding)
-    bom_encoding, input = _detect_bom(input)
-    encoding = bom_encoding or fallback_encoding
-    return encoding.codec_info.decode(input, errors)[0], encoding
+    return _get_encoding(fallback_encoding).decode(input, errors, report)
+
+
+def _decode_ascii(input):
+    """Decode :obj:`input` if it is all ASCII, or return :obj:`None`."""
+    isascii = getattr(input, 'isascii', None)  # Python 3.7+
+    if isascii is not None:
+        # Cheaper than a failed decode when there is non-ASCII.
+        return input.decode('ascii') if isascii() else None
+    try:
+        return codecs.ascii_decode(input)[0]
+    except UnicodeDecodeError:
+        return None
+
+
+class DecodeReport(object):
+    """
+    Malformed input found while decoding, for the :obj:`report` parameter
+    of :func:`decode`, :func:`iter_decode` and :class:`IncrementalDecoder`.
+
+    The error handler is still called for each malformed sequence,
+    so counting costs nothing when the input is well-formed
+    and there is no need to look for U+FFFD in the output afterwards.
+    (Which would also count U+FFFD characters that were in the input.)
+    Use a new report for each input.
+
+    """
+    def __init__(self):
+        #: The number of malformed byte sequences.
+        self.error_count = 0
+        #: The offset in bytes from the start of the input
+        #: (including any BOM) of the first malformed sequence,
+        #: or :obj:`None` if there was none.
+        self.first_error_offset = None
+        self._handler = None
+        # Offset of the chunk being decoded, and its size.
+        self._position = 0
+        self._size = 0
+
+    def __repr__(self):
+        return '<DecodeReport error_count=%i first_error_offset=%r>' % (
+            self.error_count, self.first_error_offset)
+
+    def _wrap(self, decode, errors, position):
+        """Return a function calling :obj:`decode` for consecutive chunks
+        starting at :obj:`position` in the input, that sends errors to this
+        report and then to the :obj:`errors` handler.
+        The :obj:`decode` function must use :data:`_REPORT_ERRORS`.
+
+        """
+        self._handler = codecs.lookup_error(errors)
+        self._position = position
+
+        def reporting_decode(input, *args):
+            previous = getattr(_reporting, 'report', None)
+            _reporting.report = self
+            self._size = len(input)
+            try:
+                return decode(input, *args)
+            finally:
+                _reporting.report = previous
+                self._position += self._size
+        return reporting_decode
+
+
+# The report being filled by the current thread.
+_reporting = _local()
+
+
+def _report_error(error):
+    report = _reporting.report
+    report.error_count += 1
+    if report.first_error_offset is None:
+        # Incremental decoders prepend bytes kept from the previous chunk.
+        kept = len(error.object) - report._size
+        report.first_error_offset = report._position - kept + error.start
+    return report._handler(error)
+
+
+_REPORT_ERRORS = 'webencodings.report'
+codecs.register_error(_REPORT_ERRORS, _report_error)
 
 
 def _detect_bom(input):
-    """Return (bom_encoding, input), with any BOM removed from the input."""
-    if input.startswith(b'\xFF\xFE'):
-        return _UTF16LE, input[2:]
-    if input.startswith(b'\xFE\xFF'):
-        return _UTF16BE, input[2:]
-    if input.startswith(b'\xEF\xBB\xBF'):
-        return UTF8, input[3:]
-    return None, input
+    """Return (bom_encoding, input), with any BOM removed from the input.
 
+    When there is a BOM, the rest of the input is a :class:`memoryview`.
 
-def encode(input, encoding=UTF8, errors='strict'):
+    """
+    encoding, bom_length = _bom(_head(input))
+    if bom_length:
+        input = _skip(input, bom_length)
+    return encoding, input
+
+
+def _bom(head):
+    """Return (bom_encoding, bom_length) for the first bytes of an input."""
+    if head.startswith(b'\xFF\xFE'):
+        return _encoding_from_name('utf-16le'), 2
+    if head.startswith(b'\xFE\xFF'):
+        return _encoding_from_name('utf-16be'), 2
+    if head.startswith(b'\xEF\xBB\xBF'):
+        return _encoding_from_name('utf-8'), 3
+    return None, 0
+
+
+def _head(input):
+    """Return the first (up to) three bytes of a buffer, as a byte string."""
+    head = input[:3]
+    if isinstance(head, memoryview):
+        return head.tobytes()
+    return bytes(head)
+
+
+if str is bytes:  # Python 2, where some decoders reject memoryview.
+    def _skip(input, length):
+        """Return a buffer without its first bytes."""
+        rest = input[length:]
+        if isinstance(rest, memoryview):
+            return rest.tobytes()
+        return rest
+else:
+    def _skip(input, length):
+        """Return a buffer without its first bytes, without copying."""
+        return memoryview(input)[length:]
+
+
+def decode_many(items, errors='replace', executor=None):
+    """
+    Decode many strings, each with its own fallback encoding.
+
+    Each distinct fallback encoding is only resolved once,
+    and inputs are decoded in groups that use the same encoding.
+
+    :param items:
+        An iterable of ``(input, fallback_encoding)`` pairs,
+        with the same types as the parameters of :func:`decode`.
+        Inputs can be :class:`memoryview` slices of a single shared buffer.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param executor:
+        A :class:`concurrent.futures.Executor` to decode groups in, if any.
+        With a process pool, inputs must be picklable (byte strings).
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+    :return:
+        A list of ``(output, encoding)`` tuples, like :func:`decode` returns,
+        in the order of :obj:`items`.
+
+    """
+    metrics = _metrics
+    # (fallback encoding, BOM length, input size) for each input.
+    recorded = [] if metrics is not None else None
+    resolved = {}
+    groups = {}
+    count = 0
+    for count, (input, fallback_encoding) in enumerate(items, 1):
+        encoding = resolved.get(fallback_encoding)
+        if encoding is None:
+            # Fail early if `encoding` is an invalid label.
+            encoding = resolved[fallback_encoding] = _get_encoding(
+                fallback_encoding)
+        bom_encoding, bom_length = _bom(_head(input))
+        group = groups.setdefault(bom_encoding or encoding, ([], [], []))
+        group[0].append(count - 1)
+        group[1].append(input)
+        group[2].append(bom_length)
+        if recorded is not None:
+            recorded.append((encoding, bom_length, len(input) - bom_length))
+
+    results = [None] * count
+    if executor is None:
+        for encoding, (indexes, inputs, bom_lengths) in groups.items():
+            outputs = _decode_group(encoding.name, inputs, bom_lengths, errors)
+            for index, output in zip(indexes, outputs):
+                results[index] = output, encoding
+    else:
+        tasks = []
+        for encoding, (indexes, inputs, bom_lengths) in groups.items():
+            for start in range(0, len(indexes), _DECODE_MANY_BATCH):
+                end = start + _DECODE_MANY_BATCH
+                tasks.append((encoding, indexes[start:end], executor.submit(
+                    _decode_group, encoding.name, inputs[start:end],
+                    bom_lengths[start:end], errors)))
+        for encoding, indexes, future in tasks:
+            for index, output in zip(indexes, future.result()):
+                results[index] = output, encoding
+    if recorded is not None:
+        # Inputs are counted, but not timed: they are decoded in groups.
+        for (output, encoding), (fallback_encoding, bom_length, size) in zip(
+                results, recorded):
+            metrics.decoded(encoding, fallback_encoding, bom_length > 0,
+                            size, len(output), None)
+    return results
+
+
+# Number of inputs per task submitted to an executor by decode_many().
+_DECODE_MANY_BATCH = 256
+
+
+def _decode_group(name, inputs, bom_lengths, errors):
+    """Decode inputs that all use the same encoding, without their BOM."""
+    decode = _encoding_from_name(name).codec_info.decode
+    ascii_fast_path = name in _ASCII_FAST_PATH
+    outputs = []
+    for input, bom_length in zip(inputs, bom_lengths):
+        if bom_length:
+            input = _skip(input, bom_length)
+        elif ascii_fast_path:
+            output = _decode_ascii(input)
+            if output is not None:
+                outputs.append(output)
+                continue
+        outputs.append(decode(input, errors)[0])
+    return outputs
+
+
+def encode(input, encoding='utf-8', errors='strict'):
     """
     Encode a single string.
 
@@ -180,10 +600,61 @@ def encode(input, encoding=UTF8, errors='strict'):
     :return: A byte string.
 
     """
-    return _get_encoding(encoding).codec_info.encode(input, errors)[0]
+    encoding = _get_encoding(encoding)
+    if _metrics is None:
+        return encoding._codec_encode(input, errors)[0]
+    return encoding.encode(input, errors)
+
 
+def encode_into(input, buffer, encoding='utf-8', errors='strict'):
+    """
+    Encode as much as possible of a string into an existing buffer.
 
-def iter_decode(input, fallback_encoding, errors='replace'):
+    :param input: An Unicode string.
+    :param buffer:
+        A writable buffer, such as a :class:`bytearray`
+        or a :class:`memoryview` slice of one.
+    :param encoding: An :class:`Encoding` object or a label string.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :raises:
+        :exc:`~exceptions.LookupError` for an unknown encoding label.
+        :exc:`~exceptions.ValueError` if :obj:`input` is not empty
+        and its first character does not fit in :obj:`buffer`,
+        so that a loop calling again with the rest of the input
+        always makes progress.
+    :return:
+        A ``(characters, size)`` tuple:
+        :obj:`input[:characters]` was encoded into :obj:`buffer[:size]`.
+        Call again with the rest of the input if it was not all consumed.
+
+    """
+    encode = _get_encoding(encoding).codec_info.encode
+    view = memoryview(buffer)
+    try:
+        available = len(view)
+        # Every character takes at least one byte.
+        characters = min(len(input), available)
+        while True:
+            output = encode(input[:characters], errors)[0]
+            size = len(output)
+            if size <= available:
+                break
+            # Too long, try proportionally fewer characters.
+            characters = min(characters - 1, characters * available // size)
+        if not characters and input:
+            raise ValueError(
+                'The buffer is too small for the first character.')
+        view[:size] = output
+    finally:
+        if str is not bytes:
+            # Do not wait for the garbage collector on PyPy:
+            # until then, the caller could not resize a bytearray buffer.
+            view.release()
+    return characters, size
+
+
+def iter_decode(input, fallback_encoding, errors='replace', batch_size=None,
+                report=None):
     """
     "Pull"-based decoder.
 
@@ -195,8 +666,17 @@ def iter_decode(input, fallback_encoding, errors='replace'):
         then consumed on demand when the return value is.
     :param fallback_encoding:
         An :class:`Encoding` object or a label string.
-        The encoding to use if :obj:`input` does note have a BOM.
+        The encoding to use if :obj:`input` does not have a BOM.
     :param errors: Type of error handling. See :func:`codecs.register`.
+    :param batch_size:
+        If given, once the encoding is determined,
+        consecutive input chunks are joined until they total
+        at least this many bytes, and decoded together.
+        With many small input chunks, this means fewer and larger
+        output chunks.
+    :param report:
+        A new :class:`DecodeReport` to fill with the malformed sequences
+        found in :obj:`input`, as :obj:`output` is consumed.
     :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
     :returns:
         An ``(output, encoding)`` tuple.
@@ -205,13 +685,13 @@ def iter_decode(input, fallback_encoding, errors='replace'):
 
     """
 
-    decoder = IncrementalDecoder(fallback_encoding, errors)
-    generator = _iter_decode_generator(input, decoder)
+    decoder = IncrementalDecoder(fallback_encoding, errors, report)
+    generator = _iter_decode_generator(input, decoder, batch_size)
     encoding = next(generator)
     return generator, encoding
 
 
-def _iter_decode_generator(input, decoder):
+def _iter_decode_generator(input, decoder, batch_size=None):
     """Return a generator that first yields the :obj:`Encoding`,
     then yields output chukns as Unicode strings.
 
@@ -234,6 +714,8 @@ def _iter_decode_generator(input, decoder):
             yield output
         return
 
+    if batch_size:
+        input = _iter_batches(input, batch_size)
     for chunck in input:
         output = decode(chunck)
         if output:
@@ -243,19 +725,495 @@ def _iter_decode_generator(input, decoder):
         yield output
 
 
-def iter_encode(input, encoding=UTF8, errors='strict'):
+def _iter_batches(input, size):
+    """Join consecutive byte strings until they total at least `size` bytes.
+
+    """
+    parts = []
+    length = 0
+    for chunk in input:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield parts[0] if len(parts) == 1 else b''.join(parts)
+            parts = []
+            length = 0
+    if parts:
+        yield b''.join(parts)
+
+
+def decode_to(input, fallback_encoding, sink, errors='replace',
+              max_output=None, chunk_size=FILE_BUFFER_SIZE, report=None):
+    """
+    Decode into a text sink, one chunk at a time.
+
+    Unlike :func:`decode`, the whole output is never in memory:
+    the working set is one input chunk and its decoded output.
+
+    :param input:
+        A byte string or any object supporting the buffer protocol
+        (such as :class:`mmap.mmap`), or an iterable of byte strings.
+        Chunks larger than :obj:`chunk_size` are split, without copying
+        on Python 3.
+    :param fallback_encoding:
+        An :class:`Encoding` object or a label string.
+        The encoding to use if :obj:`input` does not have a BOM.
+    :param sink:
+        An object with a ``write`` method taking an Unicode string,
+        such as a text file or :class:`io.StringIO`,
+        or a function called with each output chunk.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param max_output:
+        If given, the maximum number of characters to write to :obj:`sink`.
+    :param chunk_size: The maximum size in bytes of a decoded chunk.
+    :param report:
+        A new :class:`DecodeReport` to fill with the malformed sequences
+        found in :obj:`input`.
+    :raises:
+        :exc:`~exceptions.LookupError` for an unknown encoding label.
+        :exc:`~exceptions.ValueError` if the output is longer than
+        :obj:`max_output`. In that case, the output chunk that would
+        exceed it and any following are not written.
+    :returns:
+        An ``(encoding, input_size, output_size)`` tuple of
+        the :obj:`Encoding` that was used, the number of bytes read
+        and the number of characters written.
+
+    """
+    decoder = IncrementalDecoder(fallback_encoding, errors, report)
+    decode = decoder.decode
+    write = getattr(sink, 'write', sink)
+    input_size = output_size = 0
+    for chunk in _iter_chunks(input, chunk_size):
+        input_size += len(chunk)
+        output = decode(chunk)
+        if output:
+            output_size += len(output)
+            if max_output is not None and output_size > max_output:
+                raise ValueError(
+                    'Output longer than %i characters' % max_output)
+            write(output)
+    output = decode(b'', final=True)
+    if output:
+        output_size += len(output)
+        if max_output is not None and output_size > max_output:
+            raise ValueError('Output longer than %i characters' % max_output)
+        write(output)
+    return decoder.encoding, input_size, output_size
+
+
+def _iter_chunks(input, size):
+    """Yield a buffer or the byte strings of an iterable,
+    split into chunks of at most `size` bytes.
+
+    """
+    try:
+        memoryview(input)
+    except TypeError:
+        pass  # An iterable of byte strings
+    else:
+        input = [input]
+    for chunk in input:
+        if len(chunk) <= size:
+            yield chunk
+        else:
+            view = memoryview(chunk)
+            for start in range(0, len(view), size):
+                # As a buffer the codecs accept.
+                yield _skip(view[start:start + size], 0)
+
+
+def iter_decode_html(input, transport_encoding, fallback_encoding,
+                     errors='replace'):
+    """
+    "Pull"-based decoder for an HTML document.
+
+    The encoding is determined as in the HTML
+    `encoding sniffing algorithm
+    <https://html.spec.whatwg.org/multipage/parsing.html#encoding-sniffing-algorithm>`_:
+    a BOM takes precedence over the transport layer encoding
+    (such as the ``charset`` parameter of a ``Content-Type`` header),
+    which takes precedence over :func:`prescan_html`,
+    which takes precedence over the fallback encoding.
+    The document is only decoded once, with that encoding.
+
+    :param input:
+        An iterable of byte strings.
+
+        The input is first consumed just enough to determine the encoding:
+        3 bytes for a BOM if :obj:`transport_encoding` is known,
+        1024 bytes otherwise.
+        It is then consumed on demand when the return value is.
+    :param transport_encoding:
+        An :class:`Encoding` object, a label string, or :obj:`None`.
+        Unknown labels are ignored.
+    :param fallback_encoding:
+        An :class:`Encoding` object or a label string.
+        The encoding to use if nothing else determines one.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :raises:
+        :exc:`~exceptions.LookupError`
+        for an unknown :obj:`fallback_encoding` label.
+    :returns:
+        An ``(output, encoding)`` tuple, like :func:`iter_decode`.
+
+    """
+    from itertools import chain
+
+    fallback_encoding = _get_encoding(fallback_encoding)
+    if transport_encoding is not None and not hasattr(
+            transport_encoding, 'codec_info'):
+        transport_encoding = lookup(transport_encoding)
+    input = iter(input)
+    size = 3 if transport_encoding is not None else _PRESCAN_SIZE
+    parts = []
+    length = 0
+    for chunk in input:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            break
+    prefix = b''.join(parts)
+    if _bom(_head(prefix))[0] is None:
+        fallback_encoding = (transport_encoding or prescan_html(prefix) or
+                             fallback_encoding)
+    decoder = IncrementalDecoder(fallback_encoding, errors)
+    generator = _iter_decode_generator(chain([prefix], input), decoder)
+    encoding = next(generator)
+    return generator, encoding
+
+
+#: The number of bytes examined by :func:`prescan_html`.
+_PRESCAN_SIZE = 1024
+
+_SPACES = frozenset(bytearray(b'\t\n\f\r '))
+_SPACES_OR_SLASH = frozenset(bytearray(b'\t\n\f\r /'))
+_SPACES_OR_GT = frozenset(bytearray(b'\t\n\f\r >'))
+_QUOTES = frozenset(bytearray(b'"\''))
+_LETTERS = frozenset(bytearray(
+    b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+
+
+def prescan_html(input):
+    """
+    Determine the encoding of an HTML document
+    from a ``<meta charset>`` or ``<meta http-equiv>`` element,
+    as in the HTML `prescan
+    <https://html.spec.whatwg.org/multipage/parsing.html#prescan-a-byte-stream-to-determine-its-encoding>`_
+    algorithm.
+
+    Only the first 1024 bytes of :obj:`input` are examined.
+    This does not look for a BOM: see :func:`iter_decode_html`.
+
+    :param input: A byte string or other buffer, the start of the document.
+    :returns:
+        An :class:`Encoding` object, or :obj:`None` if none was found.
+
+    """
+    data = bytearray(input[:_PRESCAN_SIZE])
+    if data.startswith(b'<\x00?\x00x\x00'):
+        return lookup('utf-16le')
+    if data.startswith(b'\x00<\x00?\x00x'):
+        return lookup('utf-16be')
+    length = len(data)
+    position = 0
+    while True:
+        # Everything other than "<" is skipped.
+        position = data.find(b'<', position)
+        if position < 0:
+            return None
+        if data.startswith(b'<!--', position):
+            position = data.find(b'-->', position + 2)
+            if position < 0:
+                return None
+            position += 3
+        elif (position + 5 < length and
+                data[position + 5] in _SPACES_OR_SLASH and
+                data[position + 1:position + 5].lower() == b'meta'):
+            encoding, position = _prescan_meta(data, position + 6)
+            if encoding:
+                return encoding
+            if encoding is None:
+                return None  # End of input.
+        elif _is_tag(data, position + 1):
+            # Skip the tag name and attributes.
+            while position < length and data[position] not in _SPACES_OR_GT:
+                position += 1
+            while True:
+                name, value, position = _get_attribute(data, position)
+                if name is None:
+                    break
+            if position >= length:
+                return None
+            position += 1
+        elif data[position + 1:position + 2] in (b'!', b'/', b'?'):
+            position = data.find(b'>', position)
+            if position < 0:
+                return None
+            position += 1
+        else:
+            position += 1
+
+
+def _is_tag(data, position):
+    """Whether there is a start or end tag after "<" in the prescan."""
+    following = data[position:position + 2]
+    if following[:1] == b'/':
+        following = following[1:]
+    return bool(following) and following[0] in _LETTERS
+
+
+def _prescan_meta(data, position):
+    """Process the attributes of a ``<meta>`` element.
+
+    :returns:
+        An ``(encoding, position)`` tuple,
+        where :obj:`encoding` is :obj:`None` at the end of the input
+        and :obj:`False` if the element does not determine an encoding.
+
+    """
+    names = set()
+    got_pragma = False
+    need_pragma = None
+    # None is "null", False is "failure".
+    charset = None
+    while True:
+        name, value, position = _get_attribute(data, position)
+        if name is None:
+            if position >= len(data):
+                return None, position
+            break
+        if name in names:
+            continue
+        names.add(name)
+        if name == b'http-equiv':
+            if value == b'content-type':
+                got_pragma = True
+        elif name == b'content':
+            if charset is None:
+                charset = _extract_charset(value)
+                if charset is not None:
+                    need_pragma = True
+        elif name == b'charset':
+            charset = lookup_bytes(value) or False
+            need_pragma = False
+    if need_pragma is None or (need_pragma and not got_pragma) or not charset:
+        return False, position
+    if charset.name in ('utf-16le', 'utf-16be'):
+        return lookup('utf-8'), position
+    if charset.name == 'x-user-defined':
+        return lookup('windows-1252'), position
+    return charset, position
+
+
+def _get_attribute(data, position):
+    """Get an attribute, as in the HTML prescan algorithm.
+
+    :returns:
+        A ``(name, value, position)`` tuple,
+        or ``(None, None, position)`` if there is no attribute,
+        at ``>`` or at the end of the input.
+
+    """
+    length = len(data)
+    while position < length and data[position] in _SPACES_OR_SLASH:
+        position += 1
+    if position >= length or data[position] == 0x3E:  # >
+        return None, None, position
+    start = position
+    # The first byte is part of the name, even if it is "=".
+    position += 1
+    while position < length:
+        byte = data[position]
+        if byte == 0x3D or byte in _SPACES_OR_SLASH or byte == 0x3E:
+            break
+        position += 1
+    else:
+        return None, None, position
+    name = bytes(data[start:position].lower())
+    while position < length and data[position] in _SPACES:
+        position += 1
+    if position >= length:
+        return None, None, position
+    if data[position] != 0x3D:  # =
+        return name, b'', position
+    position += 1
+    while position < length and data[position] in _SPACES:
+        position += 1
+    if position >= length:
+        return None, None, position
+    byte = data[position]
+    if byte in _QUOTES:
+        end = data.find(data[position:position + 1], position + 1)
+        if end < 0:
+            return None, None, length
+        return name, data[position + 1:end].lower(), end + 1
+    if byte == 0x3E:  # >
+        return name, b'', position
+    start = position
+    while position < length and data[position] not in _SPACES_OR_GT:
+        position += 1
+    if position >= length:
+        return None, None, position
+    return name, data[start:position].lower(), position
+
+
+def _extract_charset(content):
+    """Extract a character encoding from a ``<meta content>`` value,
+    already in lower case.
+
+    :returns:
+        An :class:`Encoding` object, :obj:`None` for no encoding
+        or :obj:`False` for an unknown label.
+
+    """
+    length = len(content)
+    position = 0
+    while True:
+        position = content.find(b'charset', position)
+        if position < 0:
+            return None
+        position += 7
+        while position < length and content[position] in _SPACES:
+            position += 1
+        if position < length and content[position] == 0x3D:  # =
+            break
+    position += 1
+    while position < length and content[position] in _SPACES:
+        position += 1
+    if position >= length:
+        return None
+    if content[position] in _QUOTES:
+        end = content.find(content[position:position + 1], position + 1)
+        if end < 0:
+            return None
+        return lookup_bytes(content[position + 1:end]) or False
+    end = position
+    while (end < length and content[end] not in _SPACES and
+            content[end] != 0x3B):  # ;
+        end += 1
+    return lookup_bytes(content[position:end]) or False
+
+
+def decode_file(file, fallback_encoding, errors='replace'):
+    """
+    Decode a whole file.
+
+    The file is memory-mapped when possible rather than read into memory,
+    so that peak memory usage is about the size of the decoded text.
+
+    :param file:
+        A file name, or an integer file descriptor.
+        A file descriptor is read from its current position,
+        and is not closed.
+    :param fallback_encoding:
+        An :class:`Encoding` object or a label string.
+        The encoding to use if the file does not have a BOM.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+    :return:
+        A ``(output, encoding)`` tuple of an Unicode string
+        and an :obj:`Encoding`.
+
+    """
+    import mmap
+    # Fail early if `encoding` is an invalid label.
+    fallback_encoding = _get_encoding(fallback_encoding)
+    with _open_file(file) as fd:
+        try:
+            mapped = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):  # Empty file, pipe, ...
+            return decode(fd.read(), fallback_encoding, errors)
+        try:
+            offset = fd.tell()  # Non-zero for a file descriptor.
+            if offset:
+                return decode(_skip(mapped, offset), fallback_encoding, errors)
+            return decode(mapped, fallback_encoding, errors)
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                # A traceback still holds a memoryview of the mapping.
+                # It is closed when garbage-collected instead.
+                pass
+
+
+def iter_decode_file(file, fallback_encoding, errors='replace',
+                     buffer_size=FILE_BUFFER_SIZE):
+    """
+    "Pull"-based decoder for a file.
+
+    The file is read into a single buffer that is reused for every chunk,
+    so that peak memory usage is one buffer plus the decoded output.
+
+    :param file:
+        A file name, or an integer file descriptor.
+        A file descriptor is read from its current position,
+        and is not closed.
+    :param fallback_encoding:
+        An :class:`Encoding` object or a label string.
+        The encoding to use if the file does not have a BOM.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param buffer_size: The size of the buffer, in bytes.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+    :returns:
+        An ``(output, encoding)`` tuple, like :func:`iter_decode`.
+        The file is closed when :obj:`output` is exhausted.
+
+    """
+    decoder = IncrementalDecoder(fallback_encoding, errors)
+    generator = _iter_decode_generator(
+        _iter_file(file, buffer_size), decoder)
+    encoding = next(generator)
+    return generator, encoding
+
+
+def _open_file(file):
+    """Open a file name or file descriptor for unbuffered binary reading."""
+    if isinstance(file, int):
+        return io.open(file, 'rb', buffering=0, closefd=False)
+    return io.open(file, 'rb', buffering=0)
+
+
+def _iter_file(file, buffer_size):
+    """Yield chunks of a file, all read into the same buffer.
+
+    Each chunk must be used before the next one is read.
+
+    """
+    with _open_file(file) as fd:
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            size = fd.readinto(buffer)
+            if not size:
+                break
+            if str is bytes:
+                # Python 2, where some decoders reject memoryview.
+                yield bytes(buffer[:size])
+            else:
+                yield view[:size]
+
+
+def iter_encode(input, encoding='utf-8', errors='strict', block_size=None):
     """
     “Pull”-based encoder.
 
     :param input: An iterable of Unicode strings.
     :param encoding: An :class:`Encoding` object or a label string.
     :param errors: Type of error handling. See :func:`codecs.register`.
+    :param block_size:
+        If given, output is collected in a single reused buffer
+        and emitted in blocks of exactly this many bytes,
+        except for the last one which may be shorter.
     :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
     :returns: An iterable of byte strings.
 
     """
     # Fail early if `encoding` is an invalid label.
     encode = IncrementalEncoder(encoding, errors).encode
+    if block_size:
+        return _iter_encode_blocks(input, encode, block_size)
     return _iter_encode_generator(input, encode)
 
 
@@ -269,33 +1227,84 @@ def _iter_encode_generator(input, encode):
         yield output
 
 
+def _iter_encode_blocks(input, encode, block_size):
+    buffer = bytearray()
+    for chunck in input:
+        buffer += encode(chunck)
+        while len(buffer) >= block_size:
+            # Not through a memoryview: on PyPy, one that is not collected
+            # yet would prevent resizing the bytearray.
+            block = bytes(buffer[:block_size])
+            # Cheap: CPython bytearrays only move their start for this.
+            del buffer[:block_size]
+            yield block
+    buffer += encode('', final=True)
+    while buffer:
+        block = bytes(buffer[:block_size])
+        del buffer[:block_size]
+        yield block
+
+
 class IncrementalDecoder(object):
     """
     “Push”-based decoder.
 
     :param fallback_encoding:
         An :class:`Encoding` object or a label string.
-        The encoding to use if :obj:`input` does note have a BOM.
+        The encoding to use if :obj:`input` does not have a BOM.
     :param errors: Type of error handling. See :func:`codecs.register`.
+    :param report:
+        A new :class:`DecodeReport` to fill with the malformed sequences
+        found in the input.
     :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
 
     """
-    def __init__(self, fallback_encoding, errors='replace'):
+    def __init__(self, fallback_encoding, errors='replace', report=None):
         # Fail early if `encoding` is an invalid label.
         self._fallback_encoding = _get_encoding(fallback_encoding)
         self._errors = errors
+        self._report = report
         self._buffer = b''
         self._decoder = None
+        self._codec_decoder = None
+        # (Encoding, errors) -> codec decoder, kept by reset() for reuse.
+        self._codec_decoders = {}
         #: The actual :class:`Encoding` that is being used,
         #: or :obj:`None` if that is not determined yet.
         #: (Ie. if there is not enough input yet to determine
         #: if there is a BOM.)
         self.encoding = None  # Not known yet.
 
+    def reset(self, fallback_encoding=None, report=None):
+        """Go back to the state before any input, to decode a new input.
+
+        This is cheaper than a new decoder:
+        the underlying codec decoders are kept and reused.
+
+        :param fallback_encoding:
+            If given, an :class:`Encoding` object or a label string
+            to use instead of the current fallback encoding.
+        :param report:
+            A new :class:`DecodeReport` to fill with the malformed sequences
+            found in the new input.
+        :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+        """
+        if fallback_encoding is not None:
+            self._fallback_encoding = _get_encoding(fallback_encoding)
+        if self._codec_decoder is not None:
+            self._codec_decoder.reset()
+            self._codec_decoder = None
+        self._report = report
+        self._buffer = b''
+        self._decoder = None
+        self.encoding = None
+
     def decode(self, input, final=False):
         """Decode one chunk of the input.
 
-        :param input: A byte string.
+        :param input:
+            A byte string, or any object supporting the buffer protocol.
         :param final:
             Indicate that no more input is available.
             Must be :obj:`True` if this is the last call.
@@ -306,18 +1315,153 @@ class IncrementalDecoder(object):
         if decoder is not None:
             return decoder(input, final)
 
-        input = self._buffer + input
-        encoding, input = _detect_bom(input)
+        # Only look at the first few bytes, the input is not copied.
+        buffer = self._buffer
+        head = buffer + _head(input)
+        encoding, bom_length = _bom(head)
         if encoding is None:
-            if len(input) < 3 and not final:  # Not enough data yet.
-                self._buffer = input
+            if len(head) < 3 and not final:  # Not enough data yet.
+                self._buffer = head
                 return ''
             else:  # No BOM
                 encoding = self._fallback_encoding
-        decoder = encoding.codec_info.incrementaldecoder(self._errors).decode
-        self._decoder = decoder
+        if _metrics is not None:
+            _metrics.detected(encoding, self._fallback_encoding,
+                              bom_length > 0)
+        report = self._report
+        decoder = self._set_encoding(encoding, self._new_codec_decoder(
+            encoding, self._errors if report is None else _REPORT_ERRORS))
+        if report is not None:
+            decoder = self._decoder = report._wrap(
+                decoder, self._errors, bom_length)
+        self._buffer = b''
+        if bom_length:
+            # A whole BOM would have been detected in an earlier call,
+            # so at least its last byte is in this input.
+            return decoder(_skip(input, bom_length - len(buffer)), final)
+        elif buffer:
+            return decoder(buffer) + decoder(input, final)
+        else:
+            return decoder(input, final)
+
+    def getstate(self):
+        """Return the current state of the decoder.
+
+        Together with :meth:`setstate`, this allows resuming decoding
+        in another decoder, possibly in another process,
+        from the next byte of the input.
+
+        :raises:
+            :exc:`~exceptions.ValueError` for a CJK encoding
+            before Python 3.8, whose codecs do not support it.
+        :returns:
+            A ``(buffer, encoding_name, codec_state)`` tuple
+            of the bytes kept to look for a BOM,
+            the name of the :attr:`encoding` or :obj:`None` if not
+            determined yet, and the ``(pending, flags)``
+            :meth:`~codecs.IncrementalDecoder.getstate` of the codec.
+            It only contains byte strings, strings and integers.
+
+        """
+        if self.encoding is None:
+            return self._buffer, None, (b'', 0)
+        _check_state(self.encoding, self._codec_decoder)
+        pending, flags = self._codec_decoder.getstate()
+        return b'', self.encoding.name, (bytes(pending), flags)
+
+    def setstate(self, state):
+        """Set the state of the decoder,
+        to continue from where another decoder was.
+
+        The other decoder must have had the same fallback encoding
+        and error handling.
+        Any :class:`DecodeReport` is no longer filled.
+
+        :param state: A return value of :meth:`getstate`.
+        :raises:
+            :exc:`~exceptions.ValueError` for a CJK encoding
+            before Python 3.8, whose codecs do not support it.
+
+        """
+        buffer, name, codec_state = state
+        self.reset()
+        if name is None:
+            self._buffer = buffer
+            return
+        encoding = _encoding_from_name(name)
+        codec_decoder = self._new_codec_decoder(encoding, self._errors)
+        _check_state(encoding, codec_decoder)
+        codec_decoder.setstate(codec_state)
+        self._set_encoding(encoding, codec_decoder)
+
+    def _new_codec_decoder(self, encoding, errors):
+        """Return a codec decoder in its initial state,
+        reused from before :meth:`reset` if possible.
+
+        """
+        codec_decoder = self._codec_decoders.get((encoding, errors))
+        if codec_decoder is None:
+            codec_decoder = self._codec_decoders[encoding, errors] = (
+                encoding.codec_info.incrementaldecoder(errors))
+        return codec_decoder
+
+    def _set_encoding(self, encoding, codec_decoder):
+        """Decode the rest of the input with :obj:`codec_decoder`,
+        an incremental decoder for :obj:`encoding`.
+
+        :returns: The function decoding each chunk.
+
+        """
         self.encoding = encoding
-        return decoder(input, final)
+        self._codec_decoder = codec_decoder
+        decoder = _fast_decoder(encoding.name, codec_decoder)
+        if _metrics is not None:
+            decoder = _metrics.wrap_decoder(encoding, decoder)
+        self._decoder = decoder
+        return decoder
+
+
+def _check_state(encoding, codec_decoder):
+    """Raise :exc:`ValueError` if :obj:`codec_decoder` does not support
+    :meth:`~codecs.IncrementalDecoder.getstate` and
+    :meth:`~codecs.IncrementalDecoder.setstate`.
+
+    """
+    if sys.version_info < (3, 8):
+        import _multibytecodec
+        # CJK decoders inherit no-op methods from codecs.IncrementalDecoder.
+        if isinstance(codec_decoder,
+                      _multibytecodec.MultibyteIncrementalDecoder):
+            raise ValueError('Cannot save the state of a %s decoder '
+                             'before Python 3.8' % encoding.name)
+
+
+def _fast_decoder(name, codec_decoder):
+    """Return the decode method of :obj:`codec_decoder`,
+    wrapped with an ASCII fast path when possible.
+
+    """
+    decode = codec_decoder.decode
+    if name not in _ASCII_FAST_PATH:
+        return decode
+    elif name not in _ASCII_FAST_PATH_MULTIBYTE:
+        def fast_decode(input, final=False):
+            output = _decode_ascii(input)
+            if output is None:
+                output = decode(input, final)
+            return output
+    elif sys.version_info >= (3, 8):
+        # Only when no partial multi-byte sequence is pending.
+        getstate = codec_decoder.getstate
+
+        def fast_decode(input, final=False):
+            output = None if getstate()[0] else _decode_ascii(input)
+            if output is None:
+                output = decode(input, final)
+            return output
+    else:
+        return decode  # No getstate() for CJK decoders.
+    return fast_decode
 
 
 class IncrementalEncoder(object):
@@ -337,6 +1481,431 @@ class IncrementalEncoder(object):
         :returns: A byte string.
 
     """
-    def __init__(self, encoding=UTF8, errors='strict'):
-        encoding = _get_encoding(encoding)
-        self.encode = encoding.codec_info.incrementalencoder(errors).encode
+    def __init__(self, encoding='utf-8', errors='strict'):
+        self._errors = errors
+        # Encoding -> codec encoder, kept by reset() for reuse.
+        self._codec_encoders = {}
+        self._set_encoding(_get_encoding(encoding))
+
+    def reset(self, encoding=None):
+        """Go back to the initial state, to encode a new input.
+
+        This is cheaper than a new encoder:
+        the underlying codec encoders are kept and reused.
+
+        :param encoding:
+            If given, an :class:`Encoding` object or a label string
+            to use instead of the current encoding.
+        :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+        """
+        if encoding is not None:
+            encoding = _get_encoding(encoding)
+        self._codec_encoder.reset()
+        if encoding is not None and encoding is not self._encoding:
+            self._set_encoding(encoding)
+
+    def _set_encoding(self, encoding):
+        codec_encoder = self._codec_encoders.get(encoding)
+        if codec_encoder is None:
+            codec_encoder = self._codec_encoders[encoding] = (
+                encoding.codec_info.incrementalencoder(self._errors))
+        self._encoding = encoding
+        self._codec_encoder = codec_encoder
+        encode = codec_encoder.encode
+        if _metrics is not None:
+            encode = _metrics.wrap_encoder(encoding, encode)
+        self.encode = encode
+
+
+class TextReader(io.TextIOBase):
+    """
+    Text stream that decodes a binary stream.
+
+    Like :func:`decode`, a BOM takes precedence over the fallback encoding.
+    Lines end with ``'\\n'``: there is no newline translation.
+
+    If the binary stream is seekable, :meth:`tell` returns
+    an opaque cookie for :meth:`seek` like :class:`io.TextIOWrapper`.
+    Cookies are only valid for the :class:`TextReader` that returned them.
+
+    This is pure Python: reading lines, with :meth:`readline`
+    or by iterating, is about four times slower than with
+    :class:`io.TextIOWrapper`, which has no BOM sniffing
+    nor WHATWG labels but is a faster alternative
+    once the encoding is known.
+
+    :param stream: A readable binary file-like object.
+    :param fallback_encoding:
+        An :class:`Encoding` object or a label string.
+        The encoding to use if :obj:`stream` does not have a BOM.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param buffer_size: The number of bytes read at once from the stream.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+    """
+    # Until __init__ succeeds, there is nothing for close() to do.
+    _stream = None
+
+    def __init__(self, stream, fallback_encoding, errors='replace',
+                 buffer_size=FILE_BUFFER_SIZE):
+        self._fallback_encoding = _get_encoding(fallback_encoding)
+        self._stream = stream
+        self._errors = errors
+        self._buffer_size = buffer_size
+        self._decoder = IncrementalDecoder(self._fallback_encoding, errors)
+        # Text decoded from the last chunk read, and how much of it was used.
+        self._chars = ''
+        self._used = 0
+        self._eof = False
+        # For seekable streams: where the stream was at the beginning,
+        # where it is now and a (position, flags) snapshot of the decoder
+        # before the last chunk, or None if that cannot be known.
+        if self.seekable():
+            self._start = self._position = stream.tell()
+            self._snapshot = self._start, 0
+        else:
+            self._start = self._position = self._snapshot = None
+
+    @property
+    def encoding(self):
+        """The actual :class:`Encoding` that is being used,
+        or :obj:`None` if that is not determined yet.
+
+        """
+        return self._decoder.encoding
+
+    @property
+    def errors(self):
+        return self._errors
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._stream.seekable()
+
+    def close(self):
+        if self._stream is not None and not self.closed:
+            self._chars = ''
+            self._used = 0
+            try:
+                self._stream.close()
+            finally:
+                io.TextIOBase.close(self)
+
+    def __iter__(self):
+        self._check_closed()
+        return self._iter_lines()
+
+    def _iter_lines(self):
+        # Fast path for iterating over lines: same as readline(),
+        # without a method call for every line.
+        while True:
+            chars = self._chars
+            find = chars.find
+            used = self._used
+            end = find('\n', used) + 1
+            while end:
+                self._used = end
+                yield chars[used:end]
+                if self._chars is not chars or self._used != end:
+                    break  # Another method was called in between.
+                used = end
+                end = find('\n', used) + 1
+            else:
+                line = self.readline()
+                if not line:
+                    return
+                yield line
+
+    def read(self, size=-1):
+        """Read and return at most :obj:`size` characters,
+        or until the end of the stream if :obj:`size` is negative.
+
+        """
+        self._check_closed()
+        if size is None or size < 0:
+            parts = [self._chars[self._used:]]
+            self._used = len(self._chars)
+            while self._read_chunk():
+                parts.append(self._chars)
+                self._used = len(self._chars)
+            return ''.join(parts)
+
+        parts = []
+        while True:
+            chars = self._chars
+            used = self._used
+            end = min(len(chars), used + size)
+            parts.append(chars[used:end])
+            self._used = end
+            size -= end - used
+            if not size or not self._read_chunk():
+                return ''.join(parts)
+
+    def readline(self, size=-1):
+        """Read until ``'\\n'`` or the end of the stream,
+        and at most :obj:`size` characters if it is not negative.
+
+        """
+        self._check_closed()
+        if size is None:
+            size = -1
+        parts = []
+        while True:
+            chars = self._chars
+            used = self._used
+            limit = len(chars) if size < 0 else used + size
+            end = chars.find('\n', used, limit)
+            found = end >= 0
+            end = end + 1 if found else len(chars)
+            if size >= 0:
+                end = min(end, used + size)
+                size -= end - used
+            self._used = end
+            if found or not size:
+                if not parts:
+                    return chars[used:end]
+                parts.append(chars[used:end])
+                return ''.join(parts)
+            parts.append(chars[used:end])
+            if not self._read_chunk():
+                return ''.join(parts)
+
+    def tell(self):
+        """Return an opaque cookie for the current position."""
+        self._check_closed()
+        if self._start is None:
+            raise io.UnsupportedOperation('underlying stream is not seekable')
+        if self._snapshot is None:
+            raise io.UnsupportedOperation(
+                'cannot save the state of the %s decoder' % self.encoding.name)
+        position, flags = self._snapshot
+        return position | flags << 64 | self._used << 128
+
+    def seek(self, cookie, whence=io.SEEK_SET):
+        """Go to a position returned by :meth:`tell`,
+        or to the end of the stream with ``seek(0, io.SEEK_END)``.
+
+        """
+        self._check_closed()
+        if self._start is None:
+            raise io.UnsupportedOperation('underlying stream is not seekable')
+        if whence == io.SEEK_CUR:
+            if cookie != 0:
+                raise io.UnsupportedOperation(
+                    "can't do nonzero cur-relative seeks")
+            return self.tell()
+        elif whence == io.SEEK_END:
+            if cookie != 0:
+                raise io.UnsupportedOperation(
+                    "can't do nonzero end-relative seeks")
+            if self.encoding is None:
+                # Determine the encoding first.
+                self._restore(self._start, 0)
+                while self.encoding is None and self._read_chunk():
+                    pass
+            self._restore(self._stream.seek(0, io.SEEK_END), 0)
+            return self.tell()
+        elif whence != io.SEEK_SET:
+            raise ValueError('invalid whence (%r)' % whence)
+
+        position = cookie & 0xFFFFFFFFFFFFFFFF
+        flags = (cookie >> 64) & 0xFFFFFFFFFFFFFFFF
+        skip = cookie >> 128
+        self._restore(position, flags)
+        while skip > len(self._chars):
+            skip -= len(self._chars)
+            if not self._read_chunk():
+                raise ValueError('invalid cookie')
+        self._used = skip
+        return cookie
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+    def _read_chunk(self):
+        """Decode the next chunk of input, unless at the end of the stream.
+
+        :returns: Whether there was a chunk.
+
+        """
+        if self._eof:
+            return False
+        if self._start is not None:
+            self._snapshot = self._decoder_state()
+        input = self._stream.read(self._buffer_size)
+        if self._start is not None:
+            self._position += len(input)
+        self._eof = not input
+        self._chars = self._decoder.decode(input, final=self._eof)
+        self._used = 0
+        return True
+
+    def _decoder_state(self):
+        """Return a (position, flags) snapshot of the decoder state,
+        where position is that of the first byte not decoded yet.
+
+        """
+        try:
+            buffer, _, (pending, flags) = self._decoder.getstate()
+        except ValueError:  # CJK decoders before Python 3.8
+            return None
+        return self._position - len(buffer) - len(pending), flags
+
+    def _restore(self, position, flags):
+        """Go to :obj:`position` in the stream and reset the decoder
+        to a snapshot from :meth:`_decoder_state`.
+
+        """
+        self._stream.seek(position)
+        decoder = IncrementalDecoder(self._fallback_encoding, self._errors)
+        if position != self._start:
+            # Past the start of the stream, the encoding is already known.
+            decoder.setstate((b'', self._decoder.encoding.name, (b'', flags)))
+        self._decoder = decoder
+        self._position = position
+        self._snapshot = position, flags
+        self._chars = ''
+        self._used = 0
+        self._eof = False
+
+
+class TextWriter(io.TextIOBase):
+    """
+    Text stream that encodes to a binary stream.
+
+    Written text is accumulated and encoded in batches of
+    at least :obj:`buffer_size` characters,
+    so that many small writes only make a few writes to :obj:`stream`.
+    :meth:`close` flushes the encoder with ``final=True``,
+    which matters for stateful encodings such as ISO-2022-JP.
+    With ``errors='strict'``, an error is raised by the write that
+    encodes the batch, and that batch is discarded.
+    If :obj:`stream` is a non-blocking raw stream that would block,
+    :exc:`~io.BlockingIOError` is raised and the bytes it did not accept
+    are written by the next write or flush.
+
+    :param stream: A writable binary file-like object.
+    :param encoding: An :class:`Encoding` object or a label string.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param buffer_size:
+        The number of characters accumulated before encoding them.
+    :param line_buffering:
+        If :obj:`True`, :meth:`flush` is implied
+        when a write contains ``'\\n'``.
+    :param write_through:
+        If :obj:`True`, every write is encoded and passed to :obj:`stream`
+        immediately, without calling its :meth:`flush` method.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+    """
+    # Until __init__ succeeds, there is nothing for close() to do.
+    _stream = None
+
+    def __init__(self, stream, encoding='utf-8', errors='strict',
+                 buffer_size=FILE_BUFFER_SIZE, line_buffering=False,
+                 write_through=False):
+        self._encoding = _get_encoding(encoding)
+        self._stream = stream
+        self._raw = isinstance(stream, io.RawIOBase)
+        self._errors = errors
+        self._encode = IncrementalEncoder(self._encoding, errors).encode
+        self._buffer_size = buffer_size
+        self.line_buffering = line_buffering
+        self.write_through = write_through
+        # Text written but not encoded yet, and its total length.
+        self._pending = []
+        self._pending_size = 0
+        # Encoded bytes that a non-blocking stream did not accept yet.
+        self._unwritten = b''
+
+    @property
+    def encoding(self):
+        """The :class:`Encoding` that is being used."""
+        return self._encoding
+
+    @property
+    def errors(self):
+        return self._errors
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        """Write a Unicode string and return its length."""
+        self._check_closed()
+        if not isinstance(text, type('')):
+            raise TypeError('write() argument must be a Unicode string, not %s'
+                            % type(text).__name__)
+        self._pending.append(text)
+        size = self._pending_size = self._pending_size + len(text)
+        if self.line_buffering and '\n' in text:
+            self.flush()
+        elif size >= self._buffer_size or self.write_through:
+            self._flush_pending()
+        return len(text)
+
+    def flush(self):
+        """Encode pending text and flush :obj:`stream`."""
+        self._check_closed()
+        self._flush_pending()
+        self._stream.flush()
+
+    def close(self):
+        if self._stream is not None and not self.closed:
+            try:
+                self._flush_pending(final=True)
+                self._stream.flush()
+            finally:
+                self._pending = []
+                self._pending_size = 0
+                self._unwritten = b''
+                try:
+                    # This calls flush() again, before the stream is closed.
+                    io.TextIOBase.close(self)
+                finally:
+                    self._stream.close()
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+    def _flush_pending(self, final=False):
+        pending = self._pending
+        if len(pending) == 1:
+            text = pending[0]
+        else:
+            text = ''.join(pending)
+        self._pending = []
+        self._pending_size = 0
+        output = self._encode(text, final)
+        if output or self._unwritten:
+            self._write(output)
+
+    def _write(self, output):
+        if self._unwritten:
+            output = self._unwritten + output
+            self._unwritten = b''
+        written = self._stream.write(output)
+        if written is None and not self._raw:
+            # Such as files on Python 2, that always write everything.
+            return
+        # Raw streams such as sockets may write less than asked,
+        # and return None when they are non-blocking and would block.
+        position = 0
+        view = None
+        while written is not None:
+            position += written
+            if position >= len(output):
+                return
+            if view is None:
+                view = memoryview(output)
+            written = self._stream.write(view[position:])
+        # Like io.BufferedWriter, keep the rest for the next write or flush.
+        self._unwritten = output[position:]
+        raise io.BlockingIOError(
+            errno.EAGAIN, 'write could not complete without blocking',
+            position)
@@ -0,0 +1,247 @@
+# coding: utf-8
+"""
+
+    webencodings.aio
+    ~~~~~~~~~~~~~~~~
+
+    Streaming decoding and encoding for :mod:`asyncio`. Python 3.6+ only.
+
+    Chunks larger than :data:`OFFLOAD_SIZE` are decoded or encoded
+    in the event loop’s default executor, so that they do not block it.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import asyncio
+
+from . import IncrementalDecoder, IncrementalEncoder
+
+# The running loop, without looking up or creating one on Python 3.7+.
+_get_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+#: Chunks of at least this many bytes (when decoding)
+#: or characters (when encoding) are processed in an executor.
+OFFLOAD_SIZE = 1 << 20
+
+#: Default number of bytes read at once by :class:`StreamReader`.
+READ_SIZE = 65536
+
+
+async def aiter_decode(input, fallback_encoding, errors='replace',
+                       offload_size=OFFLOAD_SIZE):
+    """
+    "Pull"-based decoder for an asynchronous iterable.
+
+    Like :func:`~webencodings.iter_decode`,
+    but this is a coroutine that needs to be awaited::
+
+        output, encoding = await aiter_decode(input, fallback_encoding)
+        async for text in output:
+            ...
+
+    :param input:
+        An asynchronous iterable of byte strings.
+
+        The input is first consumed just enough to determine the encoding
+        based on the precense of a BOM,
+        then consumed on demand when the return value is.
+    :param fallback_encoding:
+        An :class:`~webencodings.Encoding` object or a label string.
+        The encoding to use if :obj:`input` does not have a BOM.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param offload_size: See :data:`OFFLOAD_SIZE`.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+    :returns:
+        An ``(output, encoding)`` tuple.
+        :obj:`output` is an asynchronous iterable of Unicode strings,
+        :obj:`encoding` is the :obj:`~webencodings.Encoding`
+        that is being used.
+
+    """
+    decoder = IncrementalDecoder(fallback_encoding, errors)
+    generator = _aiter_decode_generator(input, decoder, offload_size)
+    encoding = await generator.__anext__()
+    return generator, encoding
+
+
+async def _aiter_decode_generator(input, decoder, offload_size):
+    """Return an asynchronous generator that first yields the
+    :obj:`Encoding`, then yields output chunks as Unicode strings.
+
+    """
+    input = input.__aiter__()
+    async for chunk in input:
+        output = await _decode(decoder, chunk, False, offload_size)
+        if output:
+            assert decoder.encoding is not None
+            yield decoder.encoding
+            yield output
+            break
+    else:
+        # Input exhausted without determining the encoding
+        output = decoder.decode(b'', final=True)
+        assert decoder.encoding is not None
+        yield decoder.encoding
+        if output:
+            yield output
+        return
+
+    async for chunk in input:
+        output = await _decode(decoder, chunk, False, offload_size)
+        if output:
+            yield output
+    output = decoder.decode(b'', final=True)
+    if output:
+        yield output
+
+
+def aiter_encode(input, encoding='utf-8', errors='strict',
+                 offload_size=OFFLOAD_SIZE):
+    """
+    “Pull”-based encoder for an asynchronous iterable.
+
+    :param input: An asynchronous iterable of Unicode strings.
+    :param encoding:
+        An :class:`~webencodings.Encoding` object or a label string.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param offload_size: See :data:`OFFLOAD_SIZE`.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+    :returns: An asynchronous iterable of byte strings.
+
+    """
+    # Fail early if `encoding` is an invalid label.
+    encode = IncrementalEncoder(encoding, errors).encode
+    return _aiter_encode_generator(input, encode, offload_size)
+
+
+async def _aiter_encode_generator(input, encode, offload_size):
+    async for chunk in input:
+        output = await _encode(encode, chunk, False, offload_size)
+        if output:
+            yield output
+    output = encode('', final=True)
+    if output:
+        yield output
+
+
+async def _decode(decoder, input, final, offload_size):
+    """Decode a chunk, in an executor if it is large."""
+    if len(input) < offload_size:
+        return decoder.decode(input, final)
+    return await _get_loop().run_in_executor(
+        None, decoder.decode, input, final)
+
+
+async def _encode(encode, input, final, offload_size):
+    """Encode a chunk, in an executor if it is large."""
+    if len(input) < offload_size:
+        return encode(input, final)
+    return await _get_loop().run_in_executor(
+        None, encode, input, final)
+
+
+class StreamReader(object):
+    """
+    Decoding wrapper for an :class:`asyncio.StreamReader`.
+
+    It can also be used as an asynchronous iterable of Unicode strings.
+
+    :param reader:
+        An :class:`asyncio.StreamReader`, or any object with
+        a compatible ``read()`` coroutine.
+    :param fallback_encoding:
+        An :class:`~webencodings.Encoding` object or a label string.
+        The encoding to use if the stream does not have a BOM.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param read_size: The number of bytes read at once when iterating.
+    :param offload_size: See :data:`OFFLOAD_SIZE`.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+    """
+    def __init__(self, reader, fallback_encoding, errors='replace',
+                 read_size=READ_SIZE, offload_size=OFFLOAD_SIZE):
+        self._reader = reader
+        self._decoder = IncrementalDecoder(fallback_encoding, errors)
+        self._read_size = read_size
+        self._offload_size = offload_size
+        self._eof = False
+
+    @property
+    def encoding(self):
+        """The actual :class:`~webencodings.Encoding` that is being used,
+        or :obj:`None` if that is not determined yet.
+
+        """
+        return self._decoder.encoding
+
+    async def read(self, n=-1):
+        """Read up to :obj:`n` bytes, or until the end of the stream if
+        :obj:`n` is negative, and decode them.
+
+        :returns:
+            An Unicode string, only empty at the end of the stream.
+
+        """
+        while not self._eof:
+            input = await self._reader.read(n)
+            final = n < 0 or not input
+            self._eof = final
+            output = await _decode(
+                self._decoder, input, final, self._offload_size)
+            if output:
+                return output
+        return ''
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        output = await self.read(self._read_size)
+        if not output:
+            raise StopAsyncIteration
+        return output
+
+
+class StreamWriter(object):
+    """
+    Encoding wrapper for an :class:`asyncio.StreamWriter`.
+
+    :param writer:
+        An :class:`asyncio.StreamWriter`, or any object with
+        compatible ``write()``, ``drain()`` and ``close()`` methods.
+    :param encoding:
+        An :class:`~webencodings.Encoding` object or a label string.
+    :param errors: Type of error handling. See :func:`codecs.register`.
+    :param offload_size: See :data:`OFFLOAD_SIZE`.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+
+    """
+    def __init__(self, writer, encoding='utf-8', errors='strict',
+                 offload_size=OFFLOAD_SIZE):
+        self._writer = writer
+        self._encode = IncrementalEncoder(encoding, errors).encode
+        self._offload_size = offload_size
+
+    async def write(self, text):
+        """Encode and write an Unicode string,
+        then wait until the underlying writer’s buffer is drained.
+
+        """
+        output = await _encode(self._encode, text, False, self._offload_size)
+        if output:
+            self._writer.write(output)
+        await self._writer.drain()
+
+    async def close(self):
+        """Write any remaining output and close the underlying writer."""
+        output = self._encode('', final=True)
+        if output:
+            self._writer.write(output)
+            await self._writer.drain()
+        self._writer.close()
+        wait_closed = getattr(self._writer, 'wait_closed', None)
+        if wait_closed is not None:  # Python 3.7+
+            await wait_closed()
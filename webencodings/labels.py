@@ -3,7 +3,8 @@
     webencodings.labels
     ~~~~~~~~~~~~~~~~~~~
 
-    Map encoding labels to their name.
+    Map encoding labels to their name,
+    and other tables derived from the WHATWG Encoding Standard.
 
     :copyright: Copyright 2012 by Simon Sapin
     :license: BSD, see LICENSE for details.
@@ -229,3 +230,402 @@ LABELS = {
     'utf-16le':            'utf-16le',
     'x-user-defined':      'x-user-defined',
 }
+
+# LABELS with byte string keys, for lookup_bytes().
+BYTES_LABELS = {
+    b'unicode-1-1-utf-8':   'utf-8',
+    b'utf-8':               'utf-8',
+    b'utf8':                'utf-8',
+    b'866':                 'ibm866',
+    b'cp866':               'ibm866',
+    b'csibm866':            'ibm866',
+    b'ibm866':              'ibm866',
+    b'csisolatin2':         'iso-8859-2',
+    b'iso-8859-2':          'iso-8859-2',
+    b'iso-ir-101':          'iso-8859-2',
+    b'iso8859-2':           'iso-8859-2',
+    b'iso88592':            'iso-8859-2',
+    b'iso_8859-2':          'iso-8859-2',
+    b'iso_8859-2:1987':     'iso-8859-2',
+    b'l2':                  'iso-8859-2',
+    b'latin2':              'iso-8859-2',
+    b'csisolatin3':         'iso-8859-3',
+    b'iso-8859-3':          'iso-8859-3',
+    b'iso-ir-109':          'iso-8859-3',
+    b'iso8859-3':           'iso-8859-3',
+    b'iso88593':            'iso-8859-3',
+    b'iso_8859-3':          'iso-8859-3',
+    b'iso_8859-3:1988':     'iso-8859-3',
+    b'l3':                  'iso-8859-3',
+    b'latin3':              'iso-8859-3',
+    b'csisolatin4':         'iso-8859-4',
+    b'iso-8859-4':          'iso-8859-4',
+    b'iso-ir-110':          'iso-8859-4',
+    b'iso8859-4':           'iso-8859-4',
+    b'iso88594':            'iso-8859-4',
+    b'iso_8859-4':          'iso-8859-4',
+    b'iso_8859-4:1988':     'iso-8859-4',
+    b'l4':                  'iso-8859-4',
+    b'latin4':              'iso-8859-4',
+    b'csisolatincyrillic':  'iso-8859-5',
+    b'cyrillic':            'iso-8859-5',
+    b'iso-8859-5':          'iso-8859-5',
+    b'iso-ir-144':          'iso-8859-5',
+    b'iso8859-5':           'iso-8859-5',
+    b'iso88595':            'iso-8859-5',
+    b'iso_8859-5':          'iso-8859-5',
+    b'iso_8859-5:1988':     'iso-8859-5',
+    b'arabic':              'iso-8859-6',
+    b'asmo-708':            'iso-8859-6',
+    b'csiso88596e':         'iso-8859-6',
+    b'csiso88596i':         'iso-8859-6',
+    b'csisolatinarabic':    'iso-8859-6',
+    b'ecma-114':            'iso-8859-6',
+    b'iso-8859-6':          'iso-8859-6',
+    b'iso-8859-6-e':        'iso-8859-6',
+    b'iso-8859-6-i':        'iso-8859-6',
+    b'iso-ir-127':          'iso-8859-6',
+    b'iso8859-6':           'iso-8859-6',
+    b'iso88596':            'iso-8859-6',
+    b'iso_8859-6':          'iso-8859-6',
+    b'iso_8859-6:1987':     'iso-8859-6',
+    b'csisolatingreek':     'iso-8859-7',
+    b'ecma-118':            'iso-8859-7',
+    b'elot_928':            'iso-8859-7',
+    b'greek':               'iso-8859-7',
+    b'greek8':              'iso-8859-7',
+    b'iso-8859-7':          'iso-8859-7',
+    b'iso-ir-126':          'iso-8859-7',
+    b'iso8859-7':           'iso-8859-7',
+    b'iso88597':            'iso-8859-7',
+    b'iso_8859-7':          'iso-8859-7',
+    b'iso_8859-7:1987':     'iso-8859-7',
+    b'sun_eu_greek':        'iso-8859-7',
+    b'csiso88598e':         'iso-8859-8',
+    b'csisolatinhebrew':    'iso-8859-8',
+    b'hebrew':              'iso-8859-8',
+    b'iso-8859-8':          'iso-8859-8',
+    b'iso-8859-8-e':        'iso-8859-8',
+    b'iso-ir-138':          'iso-8859-8',
+    b'iso8859-8':           'iso-8859-8',
+    b'iso88598':            'iso-8859-8',
+    b'iso_8859-8':          'iso-8859-8',
+    b'iso_8859-8:1988':     'iso-8859-8',
+    b'visual':              'iso-8859-8',
+    b'csiso88598i':         'iso-8859-8-i',
+    b'iso-8859-8-i':        'iso-8859-8-i',
+    b'logical':             'iso-8859-8-i',
+    b'csisolatin6':         'iso-8859-10',
+    b'iso-8859-10':         'iso-8859-10',
+    b'iso-ir-157':          'iso-8859-10',
+    b'iso8859-10':          'iso-8859-10',
+    b'iso885910':           'iso-8859-10',
+    b'l6':                  'iso-8859-10',
+    b'latin6':              'iso-8859-10',
+    b'iso-8859-13':         'iso-8859-13',
+    b'iso8859-13':          'iso-8859-13',
+    b'iso885913':           'iso-8859-13',
+    b'iso-8859-14':         'iso-8859-14',
+    b'iso8859-14':          'iso-8859-14',
+    b'iso885914':           'iso-8859-14',
+    b'csisolatin9':         'iso-8859-15',
+    b'iso-8859-15':         'iso-8859-15',
+    b'iso8859-15':          'iso-8859-15',
+    b'iso885915':           'iso-8859-15',
+    b'iso_8859-15':         'iso-8859-15',
+    b'l9':                  'iso-8859-15',
+    b'iso-8859-16':         'iso-8859-16',
+    b'cskoi8r':             'koi8-r',
+    b'koi':                 'koi8-r',
+    b'koi8':                'koi8-r',
+    b'koi8-r':              'koi8-r',
+    b'koi8_r':              'koi8-r',
+    b'koi8-u':              'koi8-u',
+    b'csmacintosh':         'macintosh',
+    b'mac':                 'macintosh',
+    b'macintosh':           'macintosh',
+    b'x-mac-roman':         'macintosh',
+    b'dos-874':             'windows-874',
+    b'iso-8859-11':         'windows-874',
+    b'iso8859-11':          'windows-874',
+    b'iso885911':           'windows-874',
+    b'tis-620':             'windows-874',
+    b'windows-874':         'windows-874',
+    b'cp1250':              'windows-1250',
+    b'windows-1250':        'windows-1250',
+    b'x-cp1250':            'windows-1250',
+    b'cp1251':              'windows-1251',
+    b'windows-1251':        'windows-1251',
+    b'x-cp1251':            'windows-1251',
+    b'ansi_x3.4-1968':      'windows-1252',
+    b'ascii':               'windows-1252',
+    b'cp1252':              'windows-1252',
+    b'cp819':               'windows-1252',
+    b'csisolatin1':         'windows-1252',
+    b'ibm819':              'windows-1252',
+    b'iso-8859-1':          'windows-1252',
+    b'iso-ir-100':          'windows-1252',
+    b'iso8859-1':           'windows-1252',
+    b'iso88591':            'windows-1252',
+    b'iso_8859-1':          'windows-1252',
+    b'iso_8859-1:1987':     'windows-1252',
+    b'l1':                  'windows-1252',
+    b'latin1':              'windows-1252',
+    b'us-ascii':            'windows-1252',
+    b'windows-1252':        'windows-1252',
+    b'x-cp1252':            'windows-1252',
+    b'cp1253':              'windows-1253',
+    b'windows-1253':        'windows-1253',
+    b'x-cp1253':            'windows-1253',
+    b'cp1254':              'windows-1254',
+    b'csisolatin5':         'windows-1254',
+    b'iso-8859-9':          'windows-1254',
+    b'iso-ir-148':          'windows-1254',
+    b'iso8859-9':           'windows-1254',
+    b'iso88599':            'windows-1254',
+    b'iso_8859-9':          'windows-1254',
+    b'iso_8859-9:1989':     'windows-1254',
+    b'l5':                  'windows-1254',
+    b'latin5':              'windows-1254',
+    b'windows-1254':        'windows-1254',
+    b'x-cp1254':            'windows-1254',
+    b'cp1255':              'windows-1255',
+    b'windows-1255':        'windows-1255',
+    b'x-cp1255':            'windows-1255',
+    b'cp1256':              'windows-1256',
+    b'windows-1256':        'windows-1256',
+    b'x-cp1256':            'windows-1256',
+    b'cp1257':              'windows-1257',
+    b'windows-1257':        'windows-1257',
+    b'x-cp1257':            'windows-1257',
+    b'cp1258':              'windows-1258',
+    b'windows-1258':        'windows-1258',
+    b'x-cp1258':            'windows-1258',
+    b'x-mac-cyrillic':      'x-mac-cyrillic',
+    b'x-mac-ukrainian':     'x-mac-cyrillic',
+    b'chinese':             'gbk',
+    b'csgb2312':            'gbk',
+    b'csiso58gb231280':     'gbk',
+    b'gb2312':              'gbk',
+    b'gb_2312':             'gbk',
+    b'gb_2312-80':          'gbk',
+    b'gbk':                 'gbk',
+    b'iso-ir-58':           'gbk',
+    b'x-gbk':               'gbk',
+    b'gb18030':             'gb18030',
+    b'hz-gb-2312':          'hz-gb-2312',
+    b'big5':                'big5',
+    b'big5-hkscs':          'big5',
+    b'cn-big5':             'big5',
+    b'csbig5':              'big5',
+    b'x-x-big5':            'big5',
+    b'cseucpkdfmtjapanese': 'euc-jp',
+    b'euc-jp':              'euc-jp',
+    b'x-euc-jp':            'euc-jp',
+    b'csiso2022jp':         'iso-2022-jp',
+    b'iso-2022-jp':         'iso-2022-jp',
+    b'csshiftjis':          'shift_jis',
+    b'ms_kanji':            'shift_jis',
+    b'shift-jis':           'shift_jis',
+    b'shift_jis':           'shift_jis',
+    b'sjis':                'shift_jis',
+    b'windows-31j':         'shift_jis',
+    b'x-sjis':              'shift_jis',
+    b'cseuckr':             'euc-kr',
+    b'csksc56011987':       'euc-kr',
+    b'euc-kr':              'euc-kr',
+    b'iso-ir-149':          'euc-kr',
+    b'korean':              'euc-kr',
+    b'ks_c_5601-1987':      'euc-kr',
+    b'ks_c_5601-1989':      'euc-kr',
+    b'ksc5601':             'euc-kr',
+    b'ksc_5601':            'euc-kr',
+    b'windows-949':         'euc-kr',
+    b'csiso2022kr':         'iso-2022-kr',
+    b'iso-2022-kr':         'iso-2022-kr',
+    b'utf-16be':            'utf-16be',
+    b'utf-16':              'utf-16le',
+    b'utf-16le':            'utf-16le',
+    b'x-user-defined':      'x-user-defined',
+}
+
+# Encoding name -> its labels.
+NAME_LABELS = {
+    'utf-8': (
+        'unicode-1-1-utf-8', 'utf-8', 'utf8'),
+    'ibm866': (
+        '866', 'cp866', 'csibm866', 'ibm866'),
+    'iso-8859-2': (
+        'csisolatin2', 'iso-8859-2', 'iso-ir-101', 'iso8859-2', 'iso88592',
+        'iso_8859-2', 'iso_8859-2:1987', 'l2', 'latin2'),
+    'iso-8859-3': (
+        'csisolatin3', 'iso-8859-3', 'iso-ir-109', 'iso8859-3', 'iso88593',
+        'iso_8859-3', 'iso_8859-3:1988', 'l3', 'latin3'),
+    'iso-8859-4': (
+        'csisolatin4', 'iso-8859-4', 'iso-ir-110', 'iso8859-4', 'iso88594',
+        'iso_8859-4', 'iso_8859-4:1988', 'l4', 'latin4'),
+    'iso-8859-5': (
+        'csisolatincyrillic', 'cyrillic', 'iso-8859-5', 'iso-ir-144',
+        'iso8859-5', 'iso88595', 'iso_8859-5', 'iso_8859-5:1988'),
+    'iso-8859-6': (
+        'arabic', 'asmo-708', 'csiso88596e', 'csiso88596i',
+        'csisolatinarabic', 'ecma-114', 'iso-8859-6', 'iso-8859-6-e',
+        'iso-8859-6-i', 'iso-ir-127', 'iso8859-6', 'iso88596', 'iso_8859-6',
+        'iso_8859-6:1987'),
+    'iso-8859-7': (
+        'csisolatingreek', 'ecma-118', 'elot_928', 'greek', 'greek8',
+        'iso-8859-7', 'iso-ir-126', 'iso8859-7', 'iso88597', 'iso_8859-7',
+        'iso_8859-7:1987', 'sun_eu_greek'),
+    'iso-8859-8': (
+        'csiso88598e', 'csisolatinhebrew', 'hebrew', 'iso-8859-8',
+        'iso-8859-8-e', 'iso-ir-138', 'iso8859-8', 'iso88598', 'iso_8859-8',
+        'iso_8859-8:1988', 'visual'),
+    'iso-8859-8-i': (
+        'csiso88598i', 'iso-8859-8-i', 'logical'),
+    'iso-8859-10': (
+        'csisolatin6', 'iso-8859-10', 'iso-ir-157', 'iso8859-10',
+        'iso885910', 'l6', 'latin6'),
+    'iso-8859-13': (
+        'iso-8859-13', 'iso8859-13', 'iso885913'),
+    'iso-8859-14': (
+        'iso-8859-14', 'iso8859-14', 'iso885914'),
+    'iso-8859-15': (
+        'csisolatin9', 'iso-8859-15', 'iso8859-15', 'iso885915',
+        'iso_8859-15', 'l9'),
+    'iso-8859-16': (
+        'iso-8859-16',),
+    'koi8-r': (
+        'cskoi8r', 'koi', 'koi8', 'koi8-r', 'koi8_r'),
+    'koi8-u': (
+        'koi8-u',),
+    'macintosh': (
+        'csmacintosh', 'mac', 'macintosh', 'x-mac-roman'),
+    'windows-874': (
+        'dos-874', 'iso-8859-11', 'iso8859-11', 'iso885911', 'tis-620',
+        'windows-874'),
+    'windows-1250': (
+        'cp1250', 'windows-1250', 'x-cp1250'),
+    'windows-1251': (
+        'cp1251', 'windows-1251', 'x-cp1251'),
+    'windows-1252': (
+        'ansi_x3.4-1968', 'ascii', 'cp1252', 'cp819', 'csisolatin1',
+        'ibm819', 'iso-8859-1', 'iso-ir-100', 'iso8859-1', 'iso88591',
+        'iso_8859-1', 'iso_8859-1:1987', 'l1', 'latin1', 'us-ascii',
+        'windows-1252', 'x-cp1252'),
+    'windows-1253': (
+        'cp1253', 'windows-1253', 'x-cp1253'),
+    'windows-1254': (
+        'cp1254', 'csisolatin5', 'iso-8859-9', 'iso-ir-148', 'iso8859-9',
+        'iso88599', 'iso_8859-9', 'iso_8859-9:1989', 'l5', 'latin5',
+        'windows-1254', 'x-cp1254'),
+    'windows-1255': (
+        'cp1255', 'windows-1255', 'x-cp1255'),
+    'windows-1256': (
+        'cp1256', 'windows-1256', 'x-cp1256'),
+    'windows-1257': (
+        'cp1257', 'windows-1257', 'x-cp1257'),
+    'windows-1258': (
+        'cp1258', 'windows-1258', 'x-cp1258'),
+    'x-mac-cyrillic': (
+        'x-mac-cyrillic', 'x-mac-ukrainian'),
+    'gbk': (
+        'chinese', 'csgb2312', 'csiso58gb231280', 'gb2312', 'gb_2312',
+        'gb_2312-80', 'gbk', 'iso-ir-58', 'x-gbk'),
+    'gb18030': (
+        'gb18030',),
+    'hz-gb-2312': (
+        'hz-gb-2312',),
+    'big5': (
+        'big5', 'big5-hkscs', 'cn-big5', 'csbig5', 'x-x-big5'),
+    'euc-jp': (
+        'cseucpkdfmtjapanese', 'euc-jp', 'x-euc-jp'),
+    'iso-2022-jp': (
+        'csiso2022jp', 'iso-2022-jp'),
+    'shift_jis': (
+        'csshiftjis', 'ms_kanji', 'shift-jis', 'shift_jis', 'sjis',
+        'windows-31j', 'x-sjis'),
+    'euc-kr': (
+        'cseuckr', 'csksc56011987', 'euc-kr', 'iso-ir-149', 'korean',
+        'ks_c_5601-1987', 'ks_c_5601-1989', 'ksc5601', 'ksc_5601',
+        'windows-949'),
+    'iso-2022-kr': (
+        'csiso2022kr', 'iso-2022-kr'),
+    'utf-16be': (
+        'utf-16be',),
+    'utf-16le': (
+        'utf-16', 'utf-16le'),
+    'x-user-defined': (
+        'x-user-defined',),
+}
+
+# Encodings that decode each byte below 0x80 to the same ASCII character,
+# and encode ASCII characters to these bytes.
+ASCII_COMPATIBLE = frozenset([
+    'big5', 'euc-jp', 'euc-kr', 'gb18030', 'gbk', 'ibm866', 'iso-8859-10',
+    'iso-8859-13', 'iso-8859-14', 'iso-8859-15', 'iso-8859-16', 'iso-8859-2',
+    'iso-8859-3', 'iso-8859-4', 'iso-8859-5', 'iso-8859-6', 'iso-8859-7',
+    'iso-8859-8', 'iso-8859-8-i', 'koi8-r', 'koi8-u', 'macintosh',
+    'shift_jis', 'utf-8', 'windows-1250', 'windows-1251', 'windows-1252',
+    'windows-1253', 'windows-1254', 'windows-1255', 'windows-1256',
+    'windows-1257', 'windows-1258', 'windows-874', 'x-mac-cyrillic',
+    'x-user-defined'])
+
+# Encodings with one byte per character.
+SINGLE_BYTE = frozenset([
+    'ibm866', 'iso-8859-10', 'iso-8859-13', 'iso-8859-14', 'iso-8859-15',
+    'iso-8859-16', 'iso-8859-2', 'iso-8859-3', 'iso-8859-4', 'iso-8859-5',
+    'iso-8859-6', 'iso-8859-7', 'iso-8859-8', 'iso-8859-8-i', 'koi8-r',
+    'koi8-u', 'macintosh', 'windows-1250', 'windows-1251', 'windows-1252',
+    'windows-1253', 'windows-1254', 'windows-1255', 'windows-1256',
+    'windows-1257', 'windows-1258', 'windows-874', 'x-mac-cyrillic',
+    'x-user-defined'])
+
+# Encodings whose decoders and encoders switch between modes.
+STATEFUL = frozenset([
+    'hz-gb-2312', 'iso-2022-jp', 'iso-2022-kr'])
+
+# Encoding name -> Python codec name.
+# x-user-defined and replacement have their own codecs in
+# webencodings.x_user_defined and webencodings.replacement.
+PYTHON_NAMES = {
+    'utf-8':          'utf-8',
+    'ibm866':         'cp866',
+    'iso-8859-2':     'iso8859-2',
+    'iso-8859-3':     'iso8859-3',
+    'iso-8859-4':     'iso8859-4',
+    'iso-8859-5':     'iso8859-5',
+    'iso-8859-6':     'iso8859-6',
+    'iso-8859-7':     'iso8859-7',
+    'iso-8859-8':     'iso8859-8',
+    'iso-8859-8-i':   'iso8859-8',
+    'iso-8859-10':    'iso8859-10',
+    'iso-8859-13':    'iso8859-13',
+    'iso-8859-14':    'iso8859-14',
+    'iso-8859-15':    'iso8859-15',
+    'iso-8859-16':    'iso8859-16',
+    'koi8-r':         'koi8-r',
+    'koi8-u':         'koi8-u',
+    'macintosh':      'mac-roman',
+    'windows-874':    'cp874',
+    'windows-1250':   'cp1250',
+    'windows-1251':   'cp1251',
+    'windows-1252':   'cp1252',
+    'windows-1253':   'cp1253',
+    'windows-1254':   'cp1254',
+    'windows-1255':   'cp1255',
+    'windows-1256':   'cp1256',
+    'windows-1257':   'cp1257',
+    'windows-1258':   'cp1258',
+    'x-mac-cyrillic': 'mac-cyrillic',
+    'gbk':            'gbk',
+    'gb18030':        'gb18030',
+    'hz-gb-2312':     'hz',
+    'big5':           'big5',
+    'euc-jp':         'euc_jp',
+    'iso-2022-jp':    'iso2022_jp',
+    'shift_jis':      'shift_jis',
+    'euc-kr':         'euc_kr',
+    'iso-2022-kr':    'iso2022_kr',
+    'utf-16be':       'utf-16-be',
+    'utf-16le':       'utf-16-le',
+}
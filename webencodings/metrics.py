@@ -0,0 +1,259 @@
+"""
+
+    webencodings.metrics
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Opt-in counters and timings for :func:`~webencodings.lookup`,
+    :func:`~webencodings.decode`, :func:`~webencodings.encode`,
+    :func:`~webencodings.decode_many`,
+    :class:`~webencodings.IncrementalDecoder` and
+    :class:`~webencodings.IncrementalEncoder`
+    (including the ones used by :func:`~webencodings.iter_decode`,
+    :func:`~webencodings.iter_encode`, :class:`~webencodings.TextReader`
+    and :class:`~webencodings.TextWriter`).
+
+    Nothing is recorded until :func:`enable` is called.
+    Incremental decoders and encoders are only counted if they were
+    created (for encoders) or determined their encoding (for decoders)
+    while metrics are enabled.
+    :func:`~webencodings.decode_many` counts each input, but does not time
+    them since they are decoded in groups.
+    :func:`~webencodings.parallel.parallel_decode` is only recorded for
+    inputs that it decodes serially with :func:`~webencodings.decode`,
+    and :func:`~webencodings.encode_into` is not recorded.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+from . import CACHE, _set_metrics, lookup_cache_info
+
+
+#: What is passed to the callback of :func:`enable`.
+#:
+#: :obj:`kind` is one of ``'lookup'`` (for labels that were not
+#: remembered by :func:`~webencodings.lookup` yet),
+#: ``'cached_lookup'`` (for labels that were, never timed),
+#: ``'decode'``, ``'encode'``, ``'incremental_decode'`` (once per chunk),
+#: ``'incremental_encode'`` (once per chunk), or ``'detect'``
+#: (when an :class:`~webencodings.IncrementalDecoder` determines
+#: its encoding).
+#: :obj:`encoding` is the name of the encoding, or :obj:`None` for an
+#: unknown label.
+#: :obj:`input_size` and :obj:`output_size` are in bytes or characters,
+#: for decoding and encoding events.
+#: :obj:`bom` is :obj:`True` if a BOM determined the encoding,
+#: :obj:`False` if the fallback encoding was used,
+#: and :obj:`None` for events that do not make that decision.
+#: :obj:`seconds` is :obj:`None` unless timing is enabled,
+#: and for ``'detect'``.
+Event = collections.namedtuple(
+    'Event', 'kind encoding input_size output_size bom seconds')
+
+_ENCODING_COUNTERS = [
+    'decode_calls', 'decoded_bytes', 'decoded_chars', 'decode_seconds',
+    'encode_calls', 'encoded_chars', 'encoded_bytes', 'encode_seconds',
+    'bom', 'fallback', 'bom_overrides']
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def enable(callback=None, timing=False):
+    """Start recording metrics.
+
+    :param callback:
+        If given, called with an :class:`Event` for everything recorded,
+        in the thread that does the work.
+        Use it to bridge to a monitoring system.
+    :param timing:
+        Whether to also measure the time taken.
+        This adds two clock reads for every recorded call.
+
+    """
+    _recorder.callback = callback
+    _recorder.timing = timing
+    _set_metrics(_recorder)
+
+
+def disable():
+    """Stop recording metrics. Recorded values are kept."""
+    _set_metrics(None)
+
+
+def reset():
+    """Set all recorded values back to zero."""
+    _recorder.reset()
+
+
+def snapshot():
+    """Return the values recorded since the last :func:`reset`.
+
+    :returns:
+        A dict with these keys:
+
+        ``'lookup'``
+            A dict of ``'hits'`` and ``'misses'`` of the raw label cache of
+            :func:`~webencodings.lookup` (see
+            :func:`~webencodings.lookup_cache_info`),
+            ``'miss_seconds'``, the time spent on misses,
+            and ``'cached_encodings'``,
+            the number of :class:`~webencodings.Encoding` objects created.
+        ``'encodings'``
+            A dict of encoding names to dicts of counters:
+            ``'decode_calls'``, ``'decoded_bytes'``, ``'decoded_chars'``,
+            ``'decode_seconds'``, ``'encode_calls'``, ``'encoded_chars'``,
+            ``'encoded_bytes'``, ``'encode_seconds'``,
+            ``'bom'`` (inputs for which a BOM determined this encoding),
+            ``'fallback'`` (inputs without a BOM using this fallback
+            encoding) and ``'bom_overrides'`` (inputs for which a BOM
+            determined this encoding instead of another fallback encoding).
+            Calls from :class:`~webencodings.IncrementalDecoder` and
+            :class:`~webencodings.IncrementalEncoder` count every chunk.
+
+    """
+    return _recorder.snapshot()
+
+
+class _Recorder(object):
+    """The object that :mod:`webencodings` calls when metrics are enabled.
+
+    """
+    def __init__(self):
+        self.callback = None
+        self.timing = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        info = lookup_cache_info()
+        with self._lock:
+            self._encodings = {}
+            self._lookup_hits = info.hits
+            self._lookup_misses = info.misses
+            self._lookup_seconds = 0
+
+    def snapshot(self):
+        info = lookup_cache_info()
+        with self._lock:
+            hits = info.hits - self._lookup_hits
+            misses = info.misses - self._lookup_misses
+            if hits < 0 or misses < 0:
+                # lookup_cache_clear() was called since reset().
+                hits, misses = info.hits, info.misses
+            return {
+                'lookup': {
+                    'hits': hits,
+                    'misses': misses,
+                    'miss_seconds': self._lookup_seconds,
+                    'cached_encodings': len(CACHE),
+                },
+                'encodings': dict(
+                    (name, dict(counters))
+                    for name, counters in self._encodings.items()),
+            }
+
+    def start(self):
+        """Return the time before a recorded call, if timing is enabled."""
+        return _timer() if self.timing else None
+
+    def _seconds(self, start):
+        return None if start is None else _timer() - start
+
+    def _counters(self, name):
+        """Return the counters for an encoding. Call with the lock held."""
+        counters = self._encodings.get(name)
+        if counters is None:
+            counters = self._encodings[name] = dict.fromkeys(
+                _ENCODING_COUNTERS, 0)
+        return counters
+
+    def looked_up(self, encoding, start, cached=False):
+        """Record a call to :func:`~webencodings.lookup`.
+        Hits and misses are counted by the lookup cache itself.
+
+        """
+        seconds = self._seconds(start)
+        if seconds is not None:
+            with self._lock:
+                self._lookup_seconds += seconds
+        if self.callback is not None:
+            self.callback(Event('cached_lookup' if cached else 'lookup',
+                                encoding and encoding.name,
+                                None, None, None, seconds))
+
+    def detected(self, encoding, fallback_encoding, bom, kind='detect',
+                 input_size=None, output_size=None, seconds=None):
+        """Record the encoding chosen for an input."""
+        with self._lock:
+            counters = self._counters(encoding.name)
+            if bom:
+                counters['bom'] += 1
+                if encoding is not fallback_encoding:
+                    counters['bom_overrides'] += 1
+            else:
+                counters['fallback'] += 1
+            if kind != 'detect':
+                counters['decode_calls'] += 1
+                counters['decoded_bytes'] += input_size
+                counters['decoded_chars'] += output_size
+                if seconds is not None:
+                    counters['decode_seconds'] += seconds
+        if self.callback is not None:
+            self.callback(Event(kind, encoding.name, input_size, output_size,
+                                bom, seconds))
+
+    def decoded(self, encoding, fallback_encoding, bom, input_size,
+                output_size, start):
+        """Record a call to :func:`~webencodings.decode`."""
+        self.detected(encoding, fallback_encoding, bom, 'decode',
+                      input_size, output_size, self._seconds(start))
+
+    def _record(self, kind, name, input_size, output_size, start):
+        seconds = self._seconds(start)
+        prefix, input_unit, output_unit = (
+            ('decode', 'bytes', 'chars') if kind == 'incremental_decode'
+            else ('encode', 'chars', 'bytes'))
+        with self._lock:
+            counters = self._counters(name)
+            counters[prefix + '_calls'] += 1
+            counters[prefix + 'd_' + input_unit] += input_size
+            counters[prefix + 'd_' + output_unit] += output_size
+            if seconds is not None:
+                counters[prefix + '_seconds'] += seconds
+        if self.callback is not None:
+            self.callback(Event(kind, name, input_size, output_size, None,
+                                seconds))
+
+    def encoded(self, encoding, input_size, output_size, start):
+        """Record a call to :func:`~webencodings.encode`."""
+        self._record('encode', encoding.name, input_size, output_size, start)
+
+    def wrap_decoder(self, encoding, decode):
+        """Return a chunk decoding function that records every call."""
+        def recorded_decode(input, final=False):
+            start = self.start()
+            output = decode(input, final)
+            self._record('incremental_decode', encoding.name, len(input),
+                         len(output), start)
+            return output
+        return recorded_decode
+
+    def wrap_encoder(self, encoding, encode):
+        """Return a chunk encoding function that records every call."""
+        def recorded_encode(input, final=False):
+            start = self.start()
+            output = encode(input, final)
+            self._record('incremental_encode', encoding.name, len(input),
+                         len(output), start)
+            return output
+        return recorded_encode
+
+
+_recorder = _Recorder()
@@ -0,0 +1,104 @@
+"""
+
+    webencodings.mkcharmaps
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Regenarate the webencodings.charmaps module
+    from the WHATWG index files in the ``whatwg`` directory::
+
+        python webencodings/mkcharmaps.py whatwg > webencodings/charmaps.py
+
+    The directory must only contain the ``index-*.txt`` files
+    of the single-byte encodings, from https://encoding.spec.whatwg.org/
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+import io
+import os
+import sys
+
+
+# Encodings that use the index of another encoding.
+SHARED_INDEXES = {
+    'iso-8859-8-i': 'iso-8859-8',
+}
+
+
+def read_index(filename):
+    """Return a 128-items list of code points or None for bytes 0x80 to 0xFF.
+
+    """
+    code_points = [None] * 128
+    with io.open(filename, encoding='utf-8') as fd:
+        for line in fd:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                pointer, code_point = line.split()[:2]
+                code_points[int(pointer)] = int(code_point, 16)
+    return code_points
+
+
+def escape(code_point):
+    """Escape a code point for a string literal, printable ASCII as-is."""
+    if code_point is None:
+        # charmap_decode() and charmap_build() treat U+FFFE as unmapped.
+        code_point = 0xFFFE
+    char = chr(code_point) if code_point < 0x80 else None
+    if char in ('\\', "'") or not (0x20 <= code_point < 0x7F):
+        if code_point < 0x100:
+            return '\\x%02x' % code_point
+        return '\\u%04x' % code_point
+    return char
+
+
+def generate(directory):
+    parts = ['''\
+"""
+
+    webencodings.charmaps
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Decoding tables of the single-byte encodings,
+    for :func:`codecs.charmap_decode`.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+# XXX Do not edit!
+# This file is automatically generated by mkcharmaps.py
+
+from __future__ import unicode_literals
+
+# U+FFFE is an unmapped byte.
+DECODING_TABLES = {
+''']
+    names = sorted(
+        filename[len('index-'):-len('.txt')]
+        for filename in os.listdir(directory)
+        if filename.startswith('index-') and filename.endswith('.txt'))
+    aliases = sorted(
+        (name, index) for name, index in SHARED_INDEXES.items()
+        if index in names)
+    for name in names:
+        code_points = list(range(128)) + read_index(
+            os.path.join(directory, 'index-%s.txt' % name))
+        lines = [
+            ''.join(escape(code_point)
+                    for code_point in code_points[start:start + 8])
+            for start in range(0, 256, 8)]
+        parts.append("    '%s': (\n" % name)
+        parts.extend("        '%s'\n" % line for line in lines)
+        parts.append('    ),\n')
+    parts.append('}\n')
+    parts.extend("DECODING_TABLES['%s'] = DECODING_TABLES['%s']\n" % alias
+                 for alias in aliases)
+    return ''.join(parts)
+
+
+if __name__ == '__main__':
+    sys.stdout.write(generate(sys.argv[1]))
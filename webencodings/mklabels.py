@@ -3,33 +3,130 @@
     webencodings.mklabels
     ~~~~~~~~~~~~~~~~~~~~~
 
-    Regenarate the webencodings.labels module.
+    Regenarate the webencodings.labels module
+    from a local copy of the WHATWG ``encodings.json`` file::
+
+        python webencodings/mklabels.py path/to/encodings.json > \
+            webencodings/labels.py
+
+    Without an argument, the file is downloaded from
+    https://encoding.spec.whatwg.org/encodings.json
 
     :copyright: Copyright 2012 by Simon Sapin
     :license: BSD, see LICENSE for details.
 
 """
 
+import codecs
+import io
 import json
+import sys
 try:
     from urllib import urlopen
 except ImportError:
     from urllib.request import urlopen
 
 
+URL = 'https://encoding.spec.whatwg.org/encodings.json'
+
+# Encodings other than the "Legacy single-byte encodings"
+# where bytes below 0x80 are always the ASCII characters.
+# Others, including any encoding added to the standard later,
+# are not assumed to be: they may have escape sequences
+# or code units of more than one byte.
+ASCII_COMPATIBLE = frozenset([
+    'big5', 'euc-jp', 'euc-kr', 'gb18030', 'gbk', 'shift_jis', 'utf-8',
+    'x-user-defined'])
+
+# Encodings whose decoders and encoders switch between modes.
+STATEFUL = frozenset(['hz-gb-2312', 'iso-2022-jp', 'iso-2022-kr'])
+
+# Single-byte encodings outside of the "Legacy single-byte encodings".
+SINGLE_BYTE = frozenset(['x-user-defined'])
+
+# Names that are not valid Python aliases.
+PYTHON_NAMES = {
+    'iso-8859-8-i': 'iso-8859-8',
+    'x-mac-cyrillic': 'mac-cyrillic',
+    'macintosh': 'mac-roman',
+    'windows-874': 'cp874',
+}
+
+# Encodings without a Python codec.
+NO_PYTHON_CODEC = frozenset(['replacement', 'x-user-defined'])
+
+
 def assert_lower(string):
     assert string == string.lower()
     return string
 
 
-def generate(url):
-    parts = ['''\
+def read(source):
+    """Return the parsed content of a local file name or of an URL."""
+    if '://' in source:
+        return json.loads(urlopen(source).read().decode('ascii'))
+    with io.open(source, encoding='ascii') as fd:
+        return json.load(fd)
+
+
+def quote(string, prefix=''):
+    # Labels and names are printable ASCII without quotes.
+    return "%s'%s'" % (prefix, string)
+
+
+def wrap(strings, indent, end):
+    """Return quoted strings separated by commas,
+    in indented lines of at most 79 characters, followed by `end`.
+
+    """
+    lines = []
+    line = indent
+    for string in strings:
+        item = quote(string) + ','
+        if line != indent and len(line) + len(item) + len(end) >= 79:
+            lines.append(line)
+            line = indent
+        line += item if line == indent else ' ' + item
+    if len(strings) != 1:
+        line = line.rstrip(',')
+    return '\n'.join(lines + [line + end])
+
+
+def table(items, key_prefix=''):
+    """Return the lines of an aligned dict literal."""
+    items = [(quote(key, key_prefix) + ':', value) for key, value in items]
+    width = max(len(key) for key, value in items)
+    return ''.join('    %s %s,\n' % (key.ljust(width), value)
+                   for key, value in items)
+
+
+def generate(source):
+    labels = []
+    names = []
+    single_byte = set(SINGLE_BYTE)
+    # Single-byte indexes only map bytes from 0x80.
+    ascii_compatible = set(ASCII_COMPATIBLE)
+    for category in read(source):
+        for encoding in category['encodings']:
+            name = encoding['name'].lower()
+            names.append(name)
+            if category['heading'] == 'Legacy single-byte encodings':
+                single_byte.add(name)
+                ascii_compatible.add(name)
+            labels.extend((assert_lower(label), name)
+                          for label in encoding['labels'])
+    python_names = [
+        (name, quote(codecs.lookup(PYTHON_NAMES.get(name, name)).name))
+        for name in names if name not in NO_PYTHON_CODEC]
+    return ''.join([
+        '''\
 """
 
     webencodings.labels
     ~~~~~~~~~~~~~~~~~~~
 
-    Map encoding labels to their name.
+    Map encoding labels to their name,
+    and other tables derived from the WHATWG Encoding Standard.
 
     :copyright: Copyright 2012 by Simon Sapin
     :license: BSD, see LICENSE for details.
@@ -40,20 +137,51 @@ def generate(url):
 # This file is automatically generated by mklabels.py
 
 LABELS = {
-''']
-    labels = [
-        (repr(assert_lower(label)).lstrip('u'),
-         repr(encoding['name']).lstrip('u'))
-        for category in json.loads(urlopen(url).read().decode('ascii'))
-        for encoding in category['encodings']
-        for label in encoding['labels']]
-    max_len = max(len(label) for label, name in labels)
-    parts.extend(
-        '    %s:%s %s,\n' % (label, ' ' * (max_len - len(label)), name)
-        for label, name in labels)
-    parts.append('}')
-    return ''.join(parts)
+''',
+        table((label, quote(name)) for label, name in labels),
+        '''}
+
+# LABELS with byte string keys, for lookup_bytes().
+BYTES_LABELS = {
+''',
+        table(((label, quote(name)) for label, name in labels), 'b'),
+        '''}
+
+# Encoding name -> its labels.
+NAME_LABELS = {
+''',
+        ''.join('    %s: (\n%s\n' % (quote(name), wrap(
+            [label for label, label_name in labels if label_name == name],
+            ' ' * 8, '),')) for name in names),
+        '''}
+
+# Encodings that decode each byte below 0x80 to the same ASCII character,
+# and encode ASCII characters to these bytes.
+ASCII_COMPATIBLE = frozenset([
+''',
+        wrap(sorted(ascii_compatible & set(names)), '    ', '])'),
+        '''
+
+# Encodings with one byte per character.
+SINGLE_BYTE = frozenset([
+''',
+        wrap(sorted(single_byte), '    ', '])'),
+        '''
+
+# Encodings whose decoders and encoders switch between modes.
+STATEFUL = frozenset([
+''',
+        wrap(sorted(STATEFUL & set(names)), '    ', '])'),
+        '''
+
+# Encoding name -> Python codec name.
+# x-user-defined and replacement have their own codecs in
+# webencodings.x_user_defined and webencodings.replacement.
+PYTHON_NAMES = {
+''',
+        table(python_names),
+        '}\n'])
 
 
 if __name__ == '__main__':
-    print(generate('http://encoding.spec.whatwg.org/encodings.json'))
+    sys.stdout.write(generate(sys.argv[1] if len(sys.argv) > 1 else URL))
@@ -0,0 +1,201 @@
+# coding: utf-8
+"""
+
+    webencodings.parallel
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Decoding of very large documents across a pool of processes.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from . import _get_encoding, _detect_bom, lookup
+from .labels import SINGLE_BYTE
+
+
+#: Inputs smaller than this many bytes are decoded serially
+#: by :func:`parallel_decode`.
+MIN_SIZE = 4 << 20
+
+
+def parallel_decode(input, fallback_encoding, errors='replace',
+                    workers=None, executor=None, min_size=MIN_SIZE):
+    """
+    Decode a single large string, in chunks decoded by a pool of processes.
+
+    The result is the same as :func:`~webencodings.decode`,
+    including for invalid input.
+    Chunks boundaries are chosen so that no character is split:
+    this is only possible for single-byte encodings, UTF-8 and UTF-16.
+    Other encodings are decoded serially, as are inputs smaller
+    than :obj:`min_size` bytes.
+
+    The input is copied once into shared memory,
+    which requires Python 3.8 or later.
+    Earlier versions always decode serially.
+
+    Each chunk of output is sent back to this process and joined,
+    which costs about as much as decoding with the fast codecs
+    (UTF-8, UTF-16 and single-byte) in the first place.
+    Measure before using this rather than :func:`~webencodings.decode`.
+
+    :param input:
+        A byte string, or any object supporting the buffer protocol.
+    :param fallback_encoding:
+        An :class:`~webencodings.Encoding` object or a label string.
+        The encoding to use if :obj:`input` does not have a BOM.
+    :param errors:
+        Type of error handling. See :func:`codecs.register`.
+        Custom error handlers must also be registered in worker processes.
+    :param workers:
+        The number of chunks, by default :func:`os.cpu_count`.
+    :param executor:
+        A :class:`concurrent.futures.ProcessPoolExecutor` to reuse.
+        By default, a new pool of :obj:`workers` processes is created
+        for this call.
+    :param min_size: The size in bytes under which to decode serially.
+    :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+    :return:
+        A ``(output, encoding)`` tuple of an Unicode string
+        and an :obj:`~webencodings.Encoding`.
+
+    """
+    # Fail early if `encoding` is an invalid label.
+    fallback_encoding = _get_encoding(fallback_encoding)
+    bom_encoding, input = _detect_bom(input)
+    encoding = bom_encoding or fallback_encoding
+    try:
+        from multiprocessing.shared_memory import SharedMemory
+    except ImportError:  # Python < 3.8
+        return _decode(input, encoding, errors), encoding
+    workers = workers or os.cpu_count() or 1
+    view = memoryview(input)
+    offsets = None
+    if len(view) >= min_size:
+        offsets = _split(view, encoding.name, workers)
+    if offsets is None or len(offsets) < 3:  # Less than two chunks.
+        return _decode(input, encoding, errors), encoding
+
+    shared = SharedMemory(create=True, size=len(view))
+    try:
+        shared.buf[:len(view)] = view
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(workers) as executor:
+                output = _map(executor, shared.name, offsets, encoding, errors)
+        else:
+            output = _map(executor, shared.name, offsets, encoding, errors)
+    except UnicodeDecodeError:
+        # Raise the same exception as decode(), with offsets in the input.
+        output = None
+    finally:
+        shared.close()
+        shared.unlink()
+    if output is None:
+        return _decode(input, encoding, errors), encoding
+    return output, encoding
+
+
+def _decode(input, encoding, errors):
+    """Decode serially an input without its BOM,
+    which must not be looked for again.
+
+    """
+    return encoding.codec_info.decode(input, errors)[0]
+
+
+def _map(executor, shared_name, offsets, encoding, errors):
+    """Decode all chunks in the executor and join them."""
+    futures = [
+        executor.submit(
+            _decode_chunk, shared_name, start, end, encoding.name, errors)
+        for start, end in zip(offsets, offsets[1:])]
+    return ''.join(future.result() for future in futures)
+
+
+def _decode_chunk(shared_name, start, end, name, errors):
+    """Decode a chunk of shared memory, in a worker process."""
+    from multiprocessing.shared_memory import SharedMemory
+    shared = SharedMemory(shared_name)
+    try:
+        chunk = shared.buf[start:end]
+        try:
+            return lookup(name).codec_info.decode(chunk, errors)[0]
+        finally:
+            chunk.release()
+    finally:
+        shared.close()
+
+
+def _split(view, name, parts):
+    """Return offsets at which the input can be split in about equal parts,
+    starting with 0 and ending with its length,
+    or :obj:`None` if the encoding cannot be split.
+
+    """
+    if name in SINGLE_BYTE:
+        # Every byte is a character: input can be split anywhere.
+        adjust = None
+    elif name == 'utf-8':
+        adjust = _utf8_boundary
+    elif name == 'utf-16le':
+        adjust = _utf16le_boundary
+    elif name == 'utf-16be':
+        adjust = _utf16be_boundary
+    else:
+        return None
+    length = len(view)
+    offsets = [0]
+    for i in range(1, parts):
+        offset = length * i // parts
+        if offset <= offsets[-1]:
+            continue
+        if adjust is not None:
+            offset = adjust(view, offset)
+        if offset > offsets[-1]:
+            offsets.append(offset)
+    if length > offsets[-1]:
+        offsets.append(length)
+    return offsets
+
+
+def _utf8_boundary(view, offset):
+    """Move an offset back to the start of an UTF-8 sequence."""
+    # A sequence is at most 4 bytes long, so a byte preceded by three or
+    # more continuation bytes is never part of the same sequence as them.
+    for candidate in range(offset, max(offset - 4, -1), -1):
+        if not 0x80 <= view[candidate] < 0xC0:  # Not a continuation byte.
+            return candidate
+    return offset
+
+
+def _utf16le_boundary(view, offset):
+    """Move an offset back to the start of an UTF-16-LE code point."""
+    return _utf16_boundary(view, offset, high_byte=1)
+
+
+def _utf16be_boundary(view, offset):
+    """Move an offset back to the start of an UTF-16-BE code point."""
+    return _utf16_boundary(view, offset, high_byte=0)
+
+
+def _utf16_boundary(view, offset, high_byte):
+    """Move an offset back to the start of an UTF-16 code point.
+
+    `high_byte` is the position of the most significant byte of code units.
+
+    """
+    if len(view) % 2:
+        # Some Python versions report a truncated last code unit
+        # and a lone surrogate before it as a single error.
+        offset = min(offset, len(view) - 3)
+    offset -= offset % 2
+    if offset >= 2 and 0xD8 <= view[offset - 2 + high_byte] < 0xDC:
+        offset -= 2  # Do not split a surrogate pair.
+    return offset
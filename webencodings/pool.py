@@ -0,0 +1,135 @@
+"""
+
+    webencodings.pool
+    ~~~~~~~~~~~~~~~~~
+
+    Thread-safe pools of :class:`~webencodings.IncrementalDecoder`
+    and :class:`~webencodings.IncrementalEncoder` objects,
+    for programs that decode or encode many short inputs::
+
+        pool = DecoderPool()
+        decoder = pool.get(fallback_encoding)
+        try:
+            ...
+        finally:
+            pool.put(decoder)
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+from __future__ import unicode_literals
+
+from collections import deque
+
+from . import (IncrementalDecoder, IncrementalEncoder, LOOKUP_CACHE_SIZE,
+               _get_encoding)
+
+
+#: Default maximum number of idle objects kept by a pool
+#: for each combination of encoding and error handling.
+POOL_SIZE = 16
+
+
+class _Pool(object):
+    # No lock: deque.append(), deque.pop() and dict.setdefault() are atomic.
+    # Concurrent put() calls may keep a few more than `size` objects.
+
+    def __init__(self, size=POOL_SIZE):
+        self._size = size
+        # (Encoding, errors) -> deque of idle objects,
+        # and (label, errors) -> the same deque, to skip lookup().
+        self._idle = {}
+
+    def _idle_for(self, encoding, errors):
+        """Return the deque of idle objects for an encoding or a label."""
+        key = encoding, errors
+        idle = self._idle.get(key)
+        if idle is None:
+            encoding = _get_encoding(encoding)
+            idle = self._idle.get((encoding, errors))
+            if idle is None:
+                idle = self._idle.setdefault((encoding, errors), deque())
+            if len(self._idle) < LOOKUP_CACHE_SIZE:
+                self._idle[key] = idle
+        return idle
+
+    def _put(self, idle, obj):
+        if len(idle) < self._size:
+            idle.append(obj)
+
+
+class DecoderPool(_Pool):
+    """
+    A pool of :class:`~webencodings.IncrementalDecoder` objects,
+    by fallback encoding and error handling.
+
+    :param size:
+        The maximum number of idle decoders kept for each combination of
+        fallback encoding and error handling.
+        Others given to :meth:`put` are dropped.
+
+    """
+    def get(self, fallback_encoding, errors='replace'):
+        """Return a decoder in its initial state, reused if possible.
+
+        :param fallback_encoding:
+            An :class:`~webencodings.Encoding` object or a label string.
+        :param errors: Type of error handling. See :func:`codecs.register`.
+        :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+        :returns: An :class:`~webencodings.IncrementalDecoder`.
+
+        """
+        try:
+            return self._idle_for(fallback_encoding, errors).pop()
+        except IndexError:
+            return IncrementalDecoder(fallback_encoding, errors)
+
+    def put(self, decoder):
+        """Reset a decoder returned by :meth:`get`
+        and make it available to a later call.
+
+        The decoder must not be used by the caller afterwards.
+
+        """
+        decoder.reset()
+        self._put(self._idle_for(decoder._fallback_encoding, decoder._errors),
+                  decoder)
+
+
+class EncoderPool(_Pool):
+    """
+    A pool of :class:`~webencodings.IncrementalEncoder` objects,
+    by encoding and error handling.
+
+    :param size:
+        The maximum number of idle encoders kept for each combination of
+        encoding and error handling.
+        Others given to :meth:`put` are dropped.
+
+    """
+    def get(self, encoding='utf-8', errors='strict'):
+        """Return an encoder in its initial state, reused if possible.
+
+        :param encoding:
+            An :class:`~webencodings.Encoding` object or a label string.
+        :param errors: Type of error handling. See :func:`codecs.register`.
+        :raises: :exc:`~exceptions.LookupError` for an unknown encoding label.
+        :returns: An :class:`~webencodings.IncrementalEncoder`.
+
+        """
+        try:
+            return self._idle_for(encoding, errors).pop()
+        except IndexError:
+            return IncrementalEncoder(encoding, errors)
+
+    def put(self, encoder):
+        """Reset an encoder returned by :meth:`get`
+        and make it available to a later call.
+
+        The encoder must not be used by the caller afterwards.
+
+        """
+        encoder.reset()
+        self._put(self._idle_for(encoder._encoding, encoder._errors), encoder)
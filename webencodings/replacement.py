@@ -0,0 +1,97 @@
+"""
+
+    webencodings.replacement
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    An implementation of the replacement encoding.
+
+    Its labels are those of encodings that browsers stopped supporting.
+    Non-empty input decodes to a single decoding error (U+FFFD with the
+    ``'replace'`` error handling) and encoding uses UTF-8,
+    so that content in these encodings is never misinterpreted.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+from __future__ import unicode_literals
+
+import codecs
+
+
+# Codec APIs
+
+def _error(input, errors):
+    """Return the output of the error handler for the whole input."""
+    error = UnicodeDecodeError(str('replacement'), bytes(input), 0,
+                               len(input), str('replacement encoding'))
+    if errors == 'strict':
+        raise error
+    return codecs.lookup_error(errors)(error)[0]
+
+
+def encode(input, errors='strict'):
+    return codecs.utf_8_encode(input, errors)
+
+
+def decode(input, errors='strict'):
+    if not input:
+        return '', 0
+    return _error(input, errors), len(input)
+
+
+class Codec(codecs.Codec):
+
+    def encode(self, input, errors='strict'):
+        return encode(input, errors)
+
+    def decode(self, input, errors='strict'):
+        return decode(input, errors)
+
+
+class IncrementalEncoder(codecs.IncrementalEncoder):
+    def encode(self, input, final=False):
+        return encode(input, self.errors)[0]
+
+
+class IncrementalDecoder(codecs.IncrementalDecoder):
+    # Only the first non-empty chunk gives an error,
+    # then everything is ignored until reset().
+    _failed = False
+
+    def decode(self, input, final=False):
+        if self._failed or not input:
+            return ''
+        self._failed = True
+        return _error(input, self.errors)
+
+    def reset(self):
+        self._failed = False
+
+    def getstate(self):
+        return b'', int(self._failed)
+
+    def setstate(self, state):
+        self._failed = bool(state[1])
+
+
+class StreamWriter(Codec, codecs.StreamWriter):
+    pass
+
+
+class StreamReader(Codec, codecs.StreamReader):
+    pass
+
+
+# encodings module API
+
+codec_info = codecs.CodecInfo(
+    name='replacement',
+    encode=Codec().encode,
+    decode=Codec().decode,
+    incrementalencoder=IncrementalEncoder,
+    incrementaldecoder=IncrementalDecoder,
+    streamreader=StreamReader,
+    streamwriter=StreamWriter,
+)
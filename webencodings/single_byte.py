@@ -0,0 +1,68 @@
+"""
+
+    webencodings.single_byte
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Codecs for the single-byte encodings,
+    based on the WHATWG indexes in :mod:`webencodings.charmaps`
+    rather than on the Python codecs of the same name,
+    which differ for some bytes.
+
+    :copyright: Copyright 2012 by Simon Sapin
+    :license: BSD, see LICENSE for details.
+
+"""
+
+from __future__ import unicode_literals
+
+import codecs
+
+
+def codec_info(name, decoding_table=None):
+    """Return a :class:`codecs.CodecInfo` for a decoding table.
+
+    :param name: The name of the encoding.
+    :param decoding_table:
+        A string of 256 code points, one for each byte,
+        where U+FFFE is an unmapped byte.
+        By default, the table of :obj:`name` in
+        :data:`webencodings.charmaps.DECODING_TABLES`.
+
+    """
+    if decoding_table is None:
+        from .charmaps import DECODING_TABLES
+        decoding_table = DECODING_TABLES[name]
+    encoding_table = codecs.charmap_build(decoding_table)
+
+    class Codec(codecs.Codec):
+        def encode(self, input, errors='strict'):
+            return codecs.charmap_encode(input, errors, encoding_table)
+
+        def decode(self, input, errors='strict'):
+            return codecs.charmap_decode(input, errors, decoding_table)
+
+    class IncrementalEncoder(codecs.IncrementalEncoder):
+        def encode(self, input, final=False):
+            return codecs.charmap_encode(input, self.errors,
+                                         encoding_table)[0]
+
+    class IncrementalDecoder(codecs.IncrementalDecoder):
+        def decode(self, input, final=False):
+            return codecs.charmap_decode(input, self.errors,
+                                         decoding_table)[0]
+
+    class StreamWriter(Codec, codecs.StreamWriter):
+        pass
+
+    class StreamReader(Codec, codecs.StreamReader):
+        pass
+
+    return codecs.CodecInfo(
+        name=name,
+        encode=Codec().encode,
+        decode=Codec().decode,
+        incrementalencoder=IncrementalEncoder,
+        incrementaldecoder=IncrementalDecoder,
+        streamreader=StreamReader,
+        streamwriter=StreamWriter,
+    )
@@ -13,8 +13,30 @@
 
 from __future__ import unicode_literals
 
+import copy
+import io
+import mmap
+import os
+import pickle
+import random
+import subprocess
+import tempfile
+import sys
+import threading
+
 from . import (lookup, LABELS, decode, encode, iter_decode, iter_encode,
-               IncrementalDecoder, IncrementalEncoder, UTF8)
+               IncrementalDecoder, IncrementalEncoder, UTF8,
+               lookup_cache_info, lookup_cache_clear, LOOKUP_CACHE_SIZE,
+               lookup_bytes, preload, CACHE, decode_file, iter_decode_file,
+               decode_to,
+               decode_many, encode_into, TextReader, TextWriter,
+               prescan_html, iter_decode_html, DecodeReport, _ASCII_FAST_PATH,
+               _ASCII_FAST_PATH_MULTIBYTE, _encoding_from_name,
+               Encoding)
+from .parallel import parallel_decode, _split
+from . import (charmaps, labels, metrics, mkcharmaps, mklabels, replacement,
+               single_byte)
+from .pool import DecoderPool, EncoderPool
 
 
 def assert_raises(exception, function, *args, **kwargs):
@@ -45,6 +67,396 @@ def test_labels():
     assert lookup('LATİN1') is None  # ASCII-only case insensitivity.
 
 
+def test_lookup_bytes():
+    assert lookup_bytes(b'utf-8') is lookup('utf-8')
+    assert lookup_bytes(b' \r\nUTF8\t') is lookup('utf-8')
+    assert lookup_bytes(bytearray(b'LATIN1')) is lookup('windows-1252')
+    assert lookup_bytes(memoryview(b'x latin1 x')[1:-1]) is lookup('latin1')
+    assert lookup_bytes(b'u8') is None
+    assert lookup_bytes(b'utf-8\xc2\xa0') is None  # Non-ASCII white space.
+    assert lookup_bytes('LATİN1'.encode('utf8')) is None
+    for label in LABELS:
+        assert lookup_bytes(label.encode('ascii')) is lookup(label)
+
+
+def test_preload():
+    preload(['utf8', lookup('latin1')])
+    assert 'utf-8' in CACHE
+    assert 'windows-1252' in CACHE
+    preload()
+    assert set(CACHE) == set(LABELS.values())
+    assert_raises(LookupError, preload, ['invalid'])
+
+    # Labels of encodings whose name is not a label, as generated
+    # from the current WHATWG encodings.json.
+    LABELS['x-test-replacement'] = 'replacement'
+    try:
+        preload()
+        assert CACHE['replacement'].name == 'replacement'
+    finally:
+        del LABELS['x-test-replacement']
+        CACHE.pop('replacement', None)
+
+
+def test_lookup_threads():
+    results = []
+    start = threading.Event()
+
+    def lookup_all():
+        start.wait()
+        results.append([lookup(label) for label in LABELS])
+
+    # Start with cold caches, so that threads race to create encodings.
+    cached = dict(CACHE)
+    CACHE.clear()
+    lookup_cache_clear()
+    try:
+        threads = [threading.Thread(target=lookup_all) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 8
+        for result in results:
+            assert all(a is b for a, b in zip(result, results[0]))
+        assert results[0] == [CACHE[name] for name in LABELS.values()]
+        assert not any(encoding is cached.get(encoding.name)
+                       for encoding in results[0])
+    finally:
+        # Other tests compare with Encoding objects created before.
+        CACHE.clear()
+        CACHE.update(cached)
+        lookup_cache_clear()
+
+
+def test_lazy_import():
+    # Nothing is resolved until it is used.
+    code = ('import sys, webencodings\n'
+            'print(len(webencodings.CACHE))\n'
+            'print("webencodings.x_user_defined" in sys.modules)\n'
+            'print(webencodings.UTF8.name)\n')
+    process = subprocess.Popen(
+        [sys.executable, '-c', code], stdout=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = process.communicate()[0].decode('ascii').split()
+    if sys.version_info >= (3, 7):
+        assert output == ['0', 'False', 'utf-8']
+    else:
+        assert output == ['1', 'False', 'utf-8']
+    assert UTF8 is lookup('utf-8')
+
+
+def test_lookup_cache():
+    lookup_cache_clear()
+    assert lookup_cache_info() == (0, 0, LOOKUP_CACHE_SIZE, 0)
+    assert lookup(' UTF-8').name == 'utf-8'
+    assert lookup(' UTF-8') is lookup('utf8')
+    assert lookup('garbage') is None
+    assert lookup('garbage') is None
+    assert lookup_cache_info() == (2, 3, LOOKUP_CACHE_SIZE, 3)
+    for i in range(LOOKUP_CACHE_SIZE + 10):
+        assert lookup('garbage %i' % i) is None
+    assert lookup_cache_info().currsize == LOOKUP_CACHE_SIZE
+    lookup_cache_clear()
+    assert lookup_cache_info() == (0, 0, LOOKUP_CACHE_SIZE, 0)
+
+    if sys.version_info >= (3, 6):  # Dictionaries keep insertion order.
+        # A label used often is not evicted by many labels used once.
+        lookup('utf8')
+        for i in range(LOOKUP_CACHE_SIZE * 2):
+            assert lookup('garbage %i' % i) is None
+            assert lookup('utf8') is UTF8
+        info = lookup_cache_info()
+        assert info.hits == LOOKUP_CACHE_SIZE * 2
+        assert info.misses == LOOKUP_CACHE_SIZE * 2 + 1
+        lookup_cache_clear()
+
+
+def test_metrics():
+    events = []
+    metrics.reset()
+    metrics.enable(events.append, timing=True)
+    try:
+        lookup_cache_clear()
+        assert decode(b'\xef\xbb\xbfcaf\xc3\xa9', 'latin1')[0] == 'caf\xe9'
+        assert decode(b'caf\xe9', 'latin1')[0] == 'caf\xe9'
+        assert encode('caf\xe9', 'latin1') == b'caf\xe9'
+        decoder = IncrementalDecoder('utf-8')
+        assert decoder.decode(b'\xff') == ''
+        assert decoder.decode(b'\xfeh\x00i\x00', final=True) == 'hi'
+        assert IncrementalEncoder('utf-8').encode('hi', final=True) == b'hi'
+        snapshot = metrics.snapshot()
+    finally:
+        metrics.disable()
+    assert [event[:5] for event in events] == [
+        ('lookup', 'windows-1252', None, None, None),
+        ('decode', 'utf-8', 5, 4, True),
+        ('cached_lookup', 'windows-1252', None, None, None),
+        ('decode', 'windows-1252', 4, 4, False),
+        ('cached_lookup', 'windows-1252', None, None, None),
+        ('encode', 'windows-1252', 4, 4, None),
+        ('lookup', 'utf-8', None, None, None),
+        ('detect', 'utf-16le', None, None, True),
+        ('incremental_decode', 'utf-16le', 4, 2, None),
+        ('cached_lookup', 'utf-8', None, None, None),
+        ('incremental_encode', 'utf-8', 2, 2, None),
+    ]
+    assert all(event.seconds >= 0 for event in events
+               if event.kind not in ('detect', 'cached_lookup'))
+    assert all(event.seconds is None for event in events
+               if event.kind == 'cached_lookup')
+    assert snapshot['lookup']['hits'] == 3
+    assert snapshot['lookup']['misses'] == 2
+    assert snapshot['lookup']['miss_seconds'] >= 0
+    counters = snapshot['encodings']
+    assert sorted(counters) == ['utf-16le', 'utf-8', 'windows-1252']
+    assert counters['utf-8']['bom'] == counters['utf-8']['bom_overrides'] == 1
+    assert counters['utf-8']['decoded_bytes'] == 5
+    assert counters['utf-8']['encode_calls'] == 1
+    assert counters['utf-16le']['bom_overrides'] == 1
+    assert counters['windows-1252']['fallback'] == 1
+    assert counters['windows-1252']['decode_calls'] == 1
+    assert counters['windows-1252']['encoded_chars'] == 4
+
+    metrics.reset()
+    metrics.enable()
+    try:
+        assert decode_many([(b'\xef\xbb\xbfab', 'latin1'), (b'cd', 'latin1'),
+                            (b'e', 'utf-8')]) == [
+            ('ab', UTF8), ('cd', lookup('latin1')), ('e', UTF8)]
+    finally:
+        metrics.disable()
+    counters = metrics.snapshot()['encodings']
+    assert counters['utf-8']['decode_calls'] == 2
+    assert counters['utf-8']['decoded_bytes'] == 3
+    assert counters['utf-8']['bom_overrides'] == 1
+    assert counters['utf-8']['fallback'] == 1
+    assert counters['windows-1252']['decoded_chars'] == 2
+    assert counters['windows-1252']['decode_seconds'] == 0
+
+    # Nothing is recorded while disabled.
+    snapshot = metrics.snapshot()
+    decode(b'caf\xe9', 'latin1')
+    assert metrics.snapshot()['encodings'] == snapshot['encodings']
+    metrics.reset()
+    assert metrics.snapshot()['encodings'] == {}
+    assert metrics.snapshot()['lookup']['hits'] == 0
+
+
+def test_decode_report():
+    for input, label, output, count, offset in [
+            (b'caf\xc3\xa9', 'utf-8', 'caf\xe9', 0, None),
+            (b'\xef\xbf\xbd', 'utf-8', '\ufffd', 0, None),
+            (b'ab\xffc\xe2\x82d', 'utf-8', 'ab\ufffdc\ufffdd', 2, 2),
+            (b'\xef\xbb\xbfab\xff\xfe', 'latin1', 'ab\ufffd\ufffd', 2, 5),
+            (b'\xff\xfea\x00\x00\xdcb\x00', 'utf-8', 'a\ufffdb', 1, 4),
+            (b'\x82\xa0\xfd', 'shift_jis', '\u3042\ufffd', 1, 2)]:
+        report = DecodeReport()
+        assert decode(input, label, report=report) == (output, lookup(
+            'utf-16le' if input.startswith(b'\xff\xfe') else
+            'utf-8' if input.startswith(b'\xef') else label))
+        assert (report.error_count, report.first_error_offset) == (
+            count, offset)
+        for size in [1, 2, 3]:
+            report = DecodeReport()
+            chunks = [input[i:i + size] for i in range(0, len(input), size)]
+            assert ''.join(iter_decode(chunks, label, report=report)[0]) == (
+                output)
+            assert (report.error_count, report.first_error_offset) == (
+                count, offset)
+
+    report = DecodeReport()
+    decoder = IncrementalDecoder('utf-8', 'ignore', report)
+    assert decoder.decode(b'ab\xff') == 'ab'
+    assert decoder.decode(b'\xc3', final=True) == ''
+    assert (report.error_count, report.first_error_offset) == (2, 2)
+    report = DecodeReport()
+    assert_raises(UnicodeDecodeError, decode, b'a\xff', 'utf-8', 'strict',
+                  report)
+    assert (report.error_count, report.first_error_offset) == (1, 1)
+
+
+def test_decode_to():
+    text = 'caf\xe9 \u4e2d\u6587 \U0001f600\n' * 100
+    for input, label, encoding in [
+            (text.encode('utf-8'), 'utf-8', 'utf-8'),
+            (b'\xff\xfe' + text.encode('utf-16-le'), 'utf-8', 'utf-16le'),
+            (text.encode('gb18030'), 'gb18030', 'gb18030')]:
+        for chunk_size in [1, 2, 7, 100, 65536]:
+            sink = io.StringIO()
+            assert decode_to(input, label, sink, chunk_size=chunk_size) == (
+                lookup(encoding), len(input), len(text))
+            assert sink.getvalue() == text
+            chunks = []
+            pieces = [input[:5], b'', input[5:7], input[7:]]
+            assert decode_to(pieces, label, chunks.append,
+                             chunk_size=chunk_size) == (
+                lookup(encoding), len(input), len(text))
+            assert ''.join(chunks) == text
+            # Up to 2 bytes are kept until a BOM can be ruled out.
+            assert max(len(chunk) for chunk in chunks) <= chunk_size + 2
+
+    assert decode_to([], 'latin1', [].append) == (lookup('latin1'), 0, 0)
+    chunks = []
+    assert decode_to(bytearray(b'\xe9t\xe9'), 'latin1', chunks.append,
+                     max_output=3) == (lookup('latin1'), 3, 3)
+    assert chunks == ['\xe9t\xe9']
+    chunks = []
+    assert_raises(ValueError, decode_to, b'\xe9t\xe9s', 'latin1',
+                  chunks.append, max_output=3, chunk_size=1)
+    assert chunks == ['\xe9t\xe9']
+    report = DecodeReport()
+    assert decode_to([b'a\xff', b'b'], 'utf-8', [].append,
+                     report=report)[2] == 3
+    assert (report.error_count, report.first_error_offset) == (1, 1)
+
+
+def test_encoding_object():
+    try:
+        for name in set(LABELS.values()) | set(
+                ['replacement', 'x-user-defined']):
+            encoding = _encoding_from_name(name)
+            assert not hasattr(encoding, '__dict__')
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                assert pickle.loads(
+                    pickle.dumps(encoding, protocol)) is encoding
+            assert copy.copy(encoding) is encoding
+            assert copy.deepcopy([encoding])[0] is encoding
+    finally:
+        # Not in LABELS: do not leave it for test_preload().
+        CACHE.pop('replacement', None)
+    assert pickle.loads(pickle.dumps(decode(b'\xe9', 'latin1'))) == (
+        '\xe9', lookup('windows-1252'))
+
+    latin1 = lookup('latin1')
+    assert latin1.decode(b'caf\xe9') == ('caf\xe9', latin1)
+    assert latin1.decode(b'\xef\xbb\xbfcaf\xc3\xa9') == ('caf\xe9', UTF8)
+    assert_raises(UnicodeDecodeError, UTF8.decode, b'\xff', 'strict')
+    assert latin1.encode('caf\xe9') == b'caf\xe9'
+    assert latin1.encode('\u0100', 'replace') == b'?'
+    assert_raises(UnicodeEncodeError, latin1.encode, '\u0100')
+
+
+def test_reset():
+    decoder = IncrementalDecoder('latin1')
+    assert decoder.decode(b'\xff\xfea\x00\xe9') == 'a'
+    assert decoder.encoding == lookup('utf-16le')
+    decoder.reset()
+    assert decoder.encoding is None
+    assert decoder.decode(b'\xe9', final=True) == '\xe9'
+    assert decoder.encoding == lookup('windows-1252')
+    decoder.reset('utf-8')
+    assert decoder.decode(b'\xef\xbb') == ''
+    decoder.reset()
+    assert decoder.decode(b'caf\xc3') == 'caf'
+    decoder.reset()
+    assert decoder.decode(b'\xa9t\xc3\xa9', final=True) == '\ufffdt\xe9'
+    decoder.reset('latin1')
+    assert decoder.decode(b'\xff\xfeb\x00', final=True) == 'b'
+    assert len(decoder._codec_decoders) == 3  # Reused
+    report = DecodeReport()
+    decoder.reset(report=report)
+    assert decoder.decode(b'\xef\xbb\xbf\xff', final=True) == '\ufffd'
+    assert (report.error_count, report.first_error_offset) == (1, 3)
+    assert_raises(LookupError, decoder.reset, 'garbage')
+
+    encoder = IncrementalEncoder('iso-2022-jp')
+    assert encoder.encode('\u3042') == b'\x1b$B$"'
+    encoder.reset()
+    assert encoder.encode('a\u3042', final=True) == b'a\x1b$B$"\x1b(B'
+    encoder.reset('utf-8')
+    assert encoder.encode('\u3042') == b'\xe3\x81\x82'
+    encoder.reset('iso-2022-jp')
+    assert encoder.encode('a') == b'a'
+    assert len(encoder._codec_encoders) == 2
+
+
+def test_pool():
+    pool = DecoderPool(size=1)
+    decoder = pool.get('latin1')
+    assert decoder.decode(b'\xef\xbb\xbf\xc3') == ''
+    pool.put(decoder)
+    assert pool.get('windows-1252') is decoder
+    assert decoder.decode(b'\xe9', final=True) == '\xe9'
+    other = pool.get('latin1')
+    assert other is not decoder
+    assert pool.get('latin1', 'strict') is not decoder
+    assert pool.get('utf-8') is not decoder
+    pool.put(decoder)
+    pool.put(other)
+    assert pool.get('latin1') is decoder
+    assert pool.get('latin1') is not other  # Dropped, size is 1
+    assert_raises(LookupError, pool.get, 'garbage')
+
+    pool = EncoderPool()
+    encoder = pool.get('iso-2022-jp')
+    assert encoder.encode('\u3042') == b'\x1b$B$"'
+    pool.put(encoder)
+    assert pool.get('iso-2022-jp') is encoder
+    assert encoder.encode('\u3042') == b'\x1b$B$"'
+    assert pool.get() is not encoder
+
+    pool = DecoderPool()
+
+    def worker():
+        for i in range(200):
+            decoder = pool.get('utf-8')
+            outputs.append(decoder.decode(b'caf\xc3\xa9', final=True))
+            pool.put(decoder)
+    outputs = []
+    threads = [threading.Thread(target=worker) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outputs == ['caf\xe9'] * 800
+
+
+def test_decoder_state():
+    text = 'a\xe9\u4e2d\u3042\U0001f600 b\n'
+    # 'replacement' is a name but not a label.
+    replacement_encoding = _encoding_from_name('replacement')
+    for input, label in [
+            (b'abc\xffdef', replacement_encoding),
+            (text.encode('utf-8'), 'utf-8'),
+            (b'\xef\xbb\xbf' + text.encode('utf-8'), 'latin1'),
+            (b'\xff\xfe' + text.encode('utf-16-le'), 'utf-8'),
+            (text.encode('gb18030'), 'gb18030'),
+            ('a\u4e2d\u3042 b'.encode('iso-2022-jp'), 'iso-2022-jp'),
+            (b'caf\xe9 \xff', 'windows-1252')]:
+        expected = decode(input, label)[0]
+        for split in range(len(input) + 1):
+            decoder = IncrementalDecoder(label)
+            before = decoder.decode(input[:split])
+            try:
+                state = decoder.getstate()
+            except ValueError:
+                assert sys.version_info < (3, 8)
+                assert label in ('gb18030', 'iso-2022-jp')
+                break
+            state = pickle.loads(pickle.dumps(state))
+            assert decoder.decode(input[split:], final=True) == (
+                expected[len(before):])
+            resumed = IncrementalDecoder(label)
+            resumed.setstate(state)
+            assert resumed.decode(input[split:], final=True) == (
+                expected[len(before):])
+            assert resumed.encoding is decoder.encoding
+            # Also for a decoder that was used before.
+            decoder.setstate(state)
+            assert decoder.decode(input[split:], final=True) == (
+                expected[len(before):])
+    CACHE.pop('replacement')
+
+    decoder = IncrementalDecoder('utf-8')
+    assert decoder.getstate() == (b'', None, (b'', 0))
+    assert decoder.decode(b'\xff') == ''
+    assert decoder.getstate() == (b'\xff', None, (b'', 0))
+    assert decoder.decode(b'\xfea\x00\x3d') == 'a'
+    assert decoder.getstate() == (b'', 'utf-16le', (b'\x3d', 0))
+
+
 def test_all_labels():
     for label in LABELS:
         assert decode(b'', label) == ('', lookup(label))
@@ -95,6 +507,283 @@ def test_decode():
     assert decode(b'\x00\xe9', 'UTF-16') == ('\ue900', lookup('utf-16le'))
 
 
+def test_decode_buffers():
+    for input in [bytearray(b'\xEF\xBB\xBF\xc3\xa9'),
+                  memoryview(b'\xEF\xBB\xBF\xc3\xa9'),
+                  memoryview(b'x\xEF\xBB\xBF\xc3\xa9')[1:]]:
+        assert decode(input, 'ascii') == ('é', lookup('utf8'))
+    assert decode(bytearray(b'\xe9'), 'latin1') == ('é', lookup('latin1'))
+    assert decode(memoryview(b'\xFF\xFE\xe9\x00'), 'ascii') == (
+        'é', lookup('utf-16le'))
+    assert decode(bytearray(), 'utf-16be') == ('', lookup('utf-16be'))
+
+    with tempfile.TemporaryFile() as fd:
+        fd.write(b'\xFE\xFF\x00\xe9')
+        fd.flush()
+        mapped = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            assert decode(mapped, 'ascii') == ('é', lookup('utf-16be'))
+        finally:
+            mapped.close()
+
+    def iter_decode_to_string(input, fallback_encoding):
+        decoder = IncrementalDecoder(fallback_encoding)
+        output = [decoder.decode(chunk) for chunk in input]
+        output.append(decoder.decode(b'', final=True))
+        return ''.join(output), decoder.encoding
+    assert iter_decode_to_string([
+        bytearray(b'\xEF'), bytearray(b'\xBB\xBF\xc3'), bytearray(b'\xa9')],
+        'latin1') == ('é', lookup('utf8'))
+    assert iter_decode_to_string([
+        memoryview(b'\xFF'), memoryview(b'\xFE\xe9\x00')],
+        'latin1') == ('é', lookup('utf-16le'))
+    assert iter_decode_to_string([
+        b'a', memoryview(b'b'), bytearray(b'c\xe9')],
+        'latin1') == ('abcé', lookup('latin1'))
+
+
+def test_decode_file():
+    def check(content, fallback_encoding, expected, encoding):
+        fd, filename = tempfile.mkstemp()
+        try:
+            os.write(fd, content)
+            assert decode_file(filename, fallback_encoding) == (
+                expected, lookup(encoding))
+            for buffer_size in [1, 2, 3, 1024]:
+                output, _encoding = iter_decode_file(
+                    filename, fallback_encoding, buffer_size=buffer_size)
+                assert _encoding == lookup(encoding)
+                assert ''.join(output) == expected
+            rest = decode(content[1:], fallback_encoding)
+            os.lseek(fd, 1, os.SEEK_SET)
+            assert decode_file(fd, fallback_encoding) == rest
+            os.lseek(fd, 1, os.SEEK_SET)
+            output, _encoding = iter_decode_file(fd, fallback_encoding)
+            assert (''.join(output), _encoding) == rest
+            os.fstat(fd)  # Not closed.
+        finally:
+            os.close(fd)
+            os.remove(filename)
+
+    check(b'', 'latin1', '', 'latin1')
+    check(b'h\xe9llo', 'latin1', 'héllo', 'latin1')
+    check(b'\xEF\xBB\xBFh\xc3\xa9llo', 'latin1', 'héllo', 'utf-8')
+    check(b'\xFF\xFEh\x00\xe9\x00', 'latin1', 'hé', 'utf-16le')
+    check(b'\xc3\xa9' * 1000, 'utf8', 'é' * 1000, 'utf-8')
+    assert_raises(LookupError, decode_file, os.devnull, 'invalid')
+    assert_raises(LookupError, iter_decode_file, os.devnull, 'invalid')
+
+
+def test_parallel_decode_boundaries():
+    if str is bytes:  # pragma: no cover
+        return  # Python 2: memoryview items are not integers.
+    rng = random.Random(0)
+    # Mostly bytes that are interesting for UTF-8 and UTF-16 boundaries.
+    alphabet = bytearray(b'a\x00\x7f\x80\xbf\xc3\xa9\xd8\xdb\xdc\xdf'
+                         b'\xe2\x82\xac\xed\xf0\x9f\x98\x80\xf4\xf5\xff')
+    for name in ['utf-8', 'utf-16le', 'utf-16be', 'windows-1252',
+                 'x-user-defined']:
+        for _ in range(200):
+            input = bytes(bytearray(
+                rng.choice(alphabet) for _ in range(rng.randint(0, 60))))
+            codec_decode = lookup(name).codec_info.decode
+            expected = codec_decode(input, 'replace')[0]
+            for parts in [2, 3, 7]:
+                offsets = _split(memoryview(input), name, parts)
+                assert offsets[0] == 0 and offsets[-1] == len(input)
+                assert offsets == sorted(set(offsets))
+                assert ''.join(
+                    codec_decode(input[start:end], 'replace')[0]
+                    for start, end in zip(offsets, offsets[1:])
+                ) == expected
+    assert _split(memoryview(b'abc'), 'shift_jis', 2) is None
+    assert _split(memoryview(b'abc'), 'iso-2022-jp', 2) is None
+
+
+def test_parallel_decode():
+    input = b'\xEF\xBB\xBF' + 'héllo wörld '.encode('utf8') * 100 + b'\xff'
+    expected = decode(input, 'latin1')
+    assert expected[1].name == 'utf-8'
+    assert parallel_decode(input, 'latin1', workers=3, min_size=0) == expected
+    assert parallel_decode(input, 'latin1', workers=3) == expected
+    input = 'こんにちは'.encode('shift_jis') * 100
+    assert parallel_decode(input, 'shift_jis', workers=3, min_size=0) == (
+        decode(input, 'shift_jis'))
+    assert_raises(UnicodeDecodeError, parallel_decode, b'a' * 100 + b'\xff',
+                  'utf8', 'strict', workers=3, min_size=0)
+    assert_raises(LookupError, parallel_decode, b'', 'invalid')
+
+    # Only the first BOM is removed, the rest is decoded as content.
+    for input in [b'\xef\xbb\xbf\xef\xbb\xbfabc', b'\xff\xfe\xfe\xff',
+                  b'\xff\xfe\xef\xbb\xbfa\x00', b'\xfe\xff\xff\xfe\x00a',
+                  b'\xef\xbb\xbf\xff\xfeab' * 50]:
+        expected = decode(input, 'latin1')
+        assert parallel_decode(input, 'latin1') == expected
+        assert parallel_decode(input, 'latin1', workers=3,
+                               min_size=0) == expected
+    assert decode(b'\xef\xbb\xbf\xef\xbb\xbfabc', 'latin1')[0] == (
+        '\ufeffabc')
+    assert parallel_decode(b'\xff\xfe\xfe\xff', 'latin1') == (
+        '\ufffe', lookup('utf-16le'))
+
+
+def test_ascii_fast_path():
+    def iter_decode_to_string(input, fallback_encoding):
+        decoder = IncrementalDecoder(fallback_encoding)
+        output = [decoder.decode(chunk) for chunk in input]
+        output.append(decoder.decode(b'', final=True))
+        return ''.join(output)
+
+    assert _ASCII_FAST_PATH_MULTIBYTE <= _ASCII_FAST_PATH
+    assert _ASCII_FAST_PATH <= set(LABELS.values())
+    ascii = bytes(bytearray(range(128)))
+    for name in _ASCII_FAST_PATH:
+        codec_info = lookup(name).codec_info
+        assert codec_info.decode(ascii)[0] == ascii.decode('ascii'), name
+        for input in [ascii, b'caf\xe9 ' * 3, b'\xa1\xa2abc']:
+            expected = codec_info.decode(input, 'replace')[0]
+            assert decode(input, name) == (expected, lookup(name))
+            assert decode_many([(input, name)]) == [(expected, lookup(name))]
+            for split in range(len(input)):
+                assert iter_decode_to_string(
+                    [input[:split], input[split:]], name) == expected
+
+    # An ASCII chunk after the first byte of a multi-byte sequence.
+    assert iter_decode_to_string([b'a\x81', b'@bc'], 'shift_jis') == (
+        'a\u3000bc')
+    assert iter_decode_to_string([b'a\xb0', b'Abc'], 'gbk') == 'a\u7646bc'
+    assert iter_decode_to_string([b'a\x81', b'0', b'\x81', b'0b'],
+                                 'gb18030') == 'a\x80b'
+
+
+def test_decode_many():
+    shared = b'h\xe9llo\xEF\xBB\xBF\xc3\xa9\xFF\xFE\xe9\x00'
+    view = memoryview(shared)
+    items = [
+        (b'h\xe9llo', 'latin1'),
+        (b'\xc3\xa9', 'utf8'),
+        (b'\xEF\xBB\xBF\xc3\xa9', 'latin1'),
+        (b'\xc3\xa9', lookup('latin1')),
+        (b'', 'utf-16be'),
+        (view[:5], ' LATIN1 '),
+        (view[5:10], 'ascii'),
+        (view[10:], 'utf8'),
+    ]
+    expected = [decode(input, fallback) for input, fallback in items]
+    assert expected[6] == ('é', lookup('utf8'))
+    assert expected[7] == ('é', lookup('utf-16le'))
+    assert decode_many(items) == expected
+    assert decode_many(iter(items)) == expected
+    assert decode_many([]) == []
+    assert_raises(LookupError, decode_many, [(b'', 'utf8'), (b'', 'invalid')])
+
+    try:
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    except ImportError:  # pragma: no cover
+        return  # Python 2
+    with ThreadPoolExecutor(2) as executor:
+        assert decode_many(items * 200, executor=executor) == expected * 200
+    items = [(bytes(input), fallback) for input, fallback in items]
+    with ProcessPoolExecutor(2) as executor:
+        assert decode_many(items, executor=executor) == expected
+
+
+class _AsyncChunks(object):
+    """An asynchronous iterable, and a fake asyncio.StreamReader."""
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.written = []
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        import asyncio
+        if not self.chunks:
+            raise StopAsyncIteration
+        return asyncio.sleep(0, result=self.chunks.pop(0))
+
+    def read(self, n=-1):
+        import asyncio
+        if n < 0:
+            chunk = b''.join(self.chunks)
+            self.chunks = []
+        elif self.chunks:
+            chunk = self.chunks.pop(0)
+        else:
+            chunk = b''
+        return asyncio.sleep(0, result=chunk)
+
+    def write(self, data):
+        self.written.append(data)
+
+    def drain(self):
+        import asyncio
+        return asyncio.sleep(0)
+
+    def close(self):
+        self.written.append(None)
+
+
+def test_aio():
+    if sys.version_info < (3, 6):  # pragma: no cover
+        return
+    import asyncio
+    from .aio import aiter_decode, aiter_encode, StreamReader, StreamWriter
+
+    loop = asyncio.new_event_loop()
+
+    def collect(aiterable):
+        aiterator = aiterable.__aiter__()
+        output = []
+        while True:
+            try:
+                output.append(loop.run_until_complete(aiterator.__anext__()))
+            except StopAsyncIteration:
+                return output
+
+    def aiter_decode_to_string(input, fallback_encoding, **kwargs):
+        output, encoding = loop.run_until_complete(aiter_decode(
+            _AsyncChunks(input), fallback_encoding, **kwargs))
+        return ''.join(collect(output)), encoding.name
+
+    try:
+        for offload_size in [1, 1 << 20]:
+            assert aiter_decode_to_string(
+                [], 'latin1', offload_size=offload_size
+            ) == ('', 'windows-1252')
+            assert aiter_decode_to_string(
+                [b'', b'\xEF', b'', b'\xBB\xBF\xc3', b'\xa9'], 'latin1',
+                offload_size=offload_size) == ('é', 'utf-8')
+            assert aiter_decode_to_string(
+                [b'\xEF\xBB'], 'latin1', offload_size=offload_size
+            ) == ('ï»', 'windows-1252')
+            assert b''.join(collect(aiter_encode(
+                _AsyncChunks(['', 'h\uF7E9', '', 'llo']), 'x-user-defined',
+                offload_size=offload_size))) == b'h\xe9llo'
+        assert_raises(LookupError, aiter_encode, _AsyncChunks([]), 'invalid')
+        assert_raises(LookupError, loop.run_until_complete,
+                      aiter_decode(_AsyncChunks([]), 'invalid'))
+
+        reader = StreamReader(
+            _AsyncChunks([b'\xFF', b'\xFE', b'\xe9', b'\x00h\x00']), 'ascii')
+        assert reader.encoding is None
+        assert collect(reader) == ['éh']
+        assert reader.encoding.name == 'utf-16le'
+        reader = StreamReader(_AsyncChunks([b'\xc3', b'\xa9\xc3']), 'utf8')
+        assert loop.run_until_complete(reader.read()) == 'é\uFFFD'
+        assert loop.run_until_complete(reader.read()) == ''
+
+        stream = _AsyncChunks([])
+        writer = StreamWriter(stream, 'utf-16be', offload_size=1)
+        loop.run_until_complete(writer.write('h'))
+        loop.run_until_complete(writer.write('é'))
+        loop.run_until_complete(writer.close())
+        assert stream.written == [b'\x00h', b'\x00\xe9', None]
+    finally:
+        loop.close()
+
+
 def test_encode():
     assert encode('é', 'latin1') == b'\xe9'
     assert encode('é', 'utf8') == b'\xc3\xa9'
@@ -104,6 +793,37 @@ def test_encode():
     assert encode('é', 'utf-16be') == b'\x00\xe9'
 
 
+def test_encode_into():
+    buffer = bytearray(5)
+    assert encode_into('héllo', buffer) == (4, 5)
+    assert buffer == b'h\xc3\xa9ll'
+    assert encode_into('o', buffer) == (1, 1)
+    assert buffer[:1] == b'o'
+    assert encode_into('', buffer, 'latin1') == (0, 0)
+    assert encode_into('éééé', buffer, 'utf8') == (2, 4)
+    assert encode_into('éééé', memoryview(buffer)[1:], 'utf-16be') == (2, 4)
+    assert buffer == b'\xc3\x00\xe9\x00\xe9'
+    assert encode_into('h\uF7E9llo!', buffer, 'x-user-defined') == (5, 5)
+    assert buffer == b'h\xe9llo'
+    assert_raises(ValueError, encode_into, '\u2603', buffer, 'latin1',
+                  'xmlcharrefreplace')
+    assert encode_into('a\u2603', bytearray(10), 'latin1',
+                       'xmlcharrefreplace') == (2, 8)
+    assert_raises(ValueError, encode_into, 'é', bytearray(1))
+    # No buffer export is left behind.
+    buffer = bytearray(5)
+    assert encode_into('abc', buffer) == (3, 3)
+    buffer += b'de'
+    del buffer[:3]
+    assert buffer == b'\x00\x00de'
+    assert list(iter_encode(['abcdefg'], 'utf8', block_size=3)) == [
+        b'abc', b'def', b'g']
+    assert_raises(ValueError, encode_into, 'a', bytearray(0))
+    assert encode_into('', bytearray(0)) == (0, 0)
+    assert_raises(UnicodeEncodeError, encode_into, '\u2603', buffer, 'latin1')
+    assert_raises(LookupError, encode_into, '', buffer, 'invalid')
+
+
 def test_iter_decode():
     def iter_decode_to_string(input, fallback_encoding):
         output, _encoding = iter_decode(input, fallback_encoding)
@@ -132,6 +852,310 @@ def test_iter_decode():
         b'', b'h\xe9', b'llo'], 'x-user-defined') == 'h\uF7E9llo'
 
 
+def test_iter_decode_batch_size():
+    def iter_decode_to_list(input, fallback_encoding, batch_size):
+        output, encoding = iter_decode(
+            iter(input), fallback_encoding, batch_size=batch_size)
+        return list(output), encoding.name
+    input = [b'\xEF', b'\xBB', b'\xBF', b'h', b'\xc3', b'\xa9', b'llo', b'!']
+    assert iter_decode_to_list(input, 'latin1', None) == (
+        ['h', 'é', 'llo', '!'], 'utf-8')
+    assert iter_decode_to_list(input, 'latin1', 1) == (
+        ['h', 'é', 'llo', '!'], 'utf-8')
+    assert iter_decode_to_list(input, 'latin1', 3) == (
+        ['h', 'éllo', '!'], 'utf-8')
+    assert iter_decode_to_list(input, 'latin1', 1000) == (
+        ['h', 'éllo!'], 'utf-8')
+    assert iter_decode_to_list([b'a\xe9'], 'latin1', 1000) == (
+        ['aé'], 'windows-1252')
+    assert iter_decode_to_list([], 'latin1', 1000) == ([], 'windows-1252')
+
+    # The encoding is known after consuming only the first chunk.
+    consumed = []
+
+    def input():
+        for chunk in [b'hello', b'world']:
+            consumed.append(chunk)
+            yield chunk
+    output, encoding = iter_decode(input(), 'latin1', batch_size=1000)
+    assert encoding.name == 'windows-1252'
+    assert consumed == [b'hello']
+    assert list(output) == ['hello', 'world']
+
+
+def test_text_reader():
+    content = 'héllo\nwörld\n\n日本\r\nlast'
+    japanese = 'こんにちは\nworld\n\n日本\r\nlast'
+    for content, input, fallback_encoding in [
+            (content, content.encode('utf8'), 'utf8'),
+            (content, b'\xEF\xBB\xBF' + content.encode('utf8'), 'latin1'),
+            (content, b'\xFF\xFE' + content.encode('utf-16le'), 'latin1'),
+            (content, content.encode('utf-16be'), 'utf-16be'),
+            (japanese, japanese.encode('shift_jis'), 'shift_jis'),
+            (japanese, japanese.encode('iso-2022-jp'), 'iso-2022-jp')]:
+        expected = decode(input, fallback_encoding)
+        assert expected[0] == content
+        for buffer_size in [1, 2, 3, 5, 1000]:
+            def reader():
+                return TextReader(io.BytesIO(input), fallback_encoding,
+                                  buffer_size=buffer_size)
+            assert reader().read() == content
+            assert list(reader()) == content.splitlines(True)
+            stream = reader()
+            parts = []
+            while True:
+                part = stream.read(3)
+                if not part:
+                    break
+                assert len(part) <= 3
+                parts.append(part)
+            assert ''.join(parts) == content
+            assert stream.encoding == expected[1]
+            stream = reader()
+            assert stream.readline(3) == content[:3]
+            assert stream.readline(10) == content[3:6]
+            assert stream.readline(0) == ''
+            assert stream.readline() == content[6:12]
+
+            if sys.version_info < (3, 8) and 'j' in fallback_encoding:
+                continue  # No getstate() for CJK decoders.
+            stream = reader()
+            cookies = []
+            while True:
+                cookies.append((stream.tell(), stream.read(1)))
+                if not cookies[-1][1]:
+                    break
+            for cookie, char in reversed(cookies):
+                assert stream.seek(cookie) == cookie
+                assert stream.read(1) == char
+            assert stream.seek(cookies[4][0]) == cookies[4][0]
+            assert stream.read() == content[4:]
+            stream.seek(0, io.SEEK_END)
+            assert stream.read() == ''
+            stream = reader()
+            stream.seek(0, io.SEEK_END)
+            assert stream.encoding == expected[1]
+            assert stream.read() == ''
+            stream.seek(0)
+            assert stream.readline() == content[:6]
+
+    class NotSeekable(io.BytesIO):
+        def seekable(self):
+            return False
+    stream = TextReader(NotSeekable(b'abc'), 'latin1')
+    assert not stream.seekable()
+    assert_raises(io.UnsupportedOperation, stream.tell)
+    assert stream.read() == 'abc'
+    stream.close()
+    assert stream.closed
+    assert_raises(ValueError, stream.read)
+    sink = io.BytesIO()
+    assert_raises(LookupError, TextReader, sink, 'invalid')
+    assert not sink.closed
+
+
+def test_text_writer():
+    class Sink(io.BytesIO):
+        writes = 0
+        flushes = 0
+
+        def write(self, data):
+            self.writes += 1
+            # Partial writes, like a raw socket.
+            return io.BytesIO.write(self, bytes(bytearray(data[:2])))
+
+        def flush(self):
+            self.flushes += 1
+
+        def close(self):
+            self.value = self.getvalue()
+            io.BytesIO.close(self)
+
+    sink = Sink()
+    stream = TextWriter(sink, 'iso-2022-jp', buffer_size=6)
+    assert stream.encoding == lookup('iso-2022-jp')
+    assert stream.writable()
+    for part in ['日', '本', '語', 'a', '', 'b']:
+        assert stream.write(part) == len(part)
+        assert sink.writes == 0
+    assert stream.write('日本') == 2
+    # 6 characters were not encoded all at once.
+    assert sink.getvalue() == '日本語ab日本'.encode('iso-2022-jp')[:-3]
+    stream.close()
+    assert stream.closed
+    assert sink.value == '日本語ab日本'.encode('iso-2022-jp')
+    assert_raises(ValueError, stream.write, 'a')
+
+    sink = Sink()
+    stream = TextWriter(sink, 'utf-16be', line_buffering=True)
+    stream.write('a')
+    assert sink.getvalue() == b''
+    stream.write('b\nc')
+    assert sink.getvalue() == b'\x00a\x00b\x00\n\x00c'
+    assert sink.flushes == 1
+    assert_raises(TypeError, stream.write, b'd')
+
+    sink = Sink()
+    stream = TextWriter(sink, 'latin1', errors='replace', write_through=True)
+    stream.write('é')
+    stream.write('\u0100')
+    assert sink.getvalue() == b'\xe9?'
+    assert sink.flushes == 0
+    stream.flush()
+    assert sink.flushes == 1
+
+    stream = TextWriter(Sink(), 'latin1')
+    stream.write('é\u0100')
+    assert_raises(UnicodeEncodeError, stream.flush)
+    sink = io.BytesIO()
+    assert_raises(LookupError, TextWriter, sink, 'invalid')
+    assert not sink.closed
+    stream = TextWriter(sink)
+    stream.write('a')
+    stream.close()
+    assert sink.closed
+
+    class NonBlocking(io.RawIOBase):
+        # Accepts `available` more bytes, then returns None.
+        available = 0
+
+        def __init__(self):
+            self.received = bytearray()
+
+        def writable(self):
+            return True
+
+        def write(self, data):
+            if not self.available:
+                return None
+            data = bytearray(data[:min(2, self.available)])
+            self.available -= len(data)
+            self.received += data
+            return len(data)
+
+    def blocking_write(text):
+        try:
+            stream.write(text)
+        except io.BlockingIOError as error:
+            return error.characters_written
+        raise AssertionError('write did not block')
+
+    sink = NonBlocking()
+    stream = TextWriter(sink, 'utf-8', write_through=True)
+    assert blocking_write('a') == 0
+    sink.available = 3
+    assert blocking_write('bcdé') == 3
+    assert sink.received == b'abc'
+    sink.available = 100
+    stream.write('f')
+    assert sink.received == b'abcd\xc3\xa9f'
+    sink.available = 1
+    assert blocking_write('gh') == 1
+    sink.available = 100
+    stream.flush()
+    assert sink.received == b'abcd\xc3\xa9fgh'
+
+    metrics.reset()
+    metrics.enable()
+    try:
+        stream = TextWriter(io.BytesIO(), 'latin1', write_through=True)
+        stream.write('abc')
+    finally:
+        metrics.disable()
+    assert metrics.snapshot()['encodings']['windows-1252'][
+        'encoded_chars'] == 3
+
+
+def test_prescan_html():
+    def prescan(input):
+        encoding = prescan_html(input)
+        return encoding and encoding.name
+
+    assert prescan(b'') is None
+    assert prescan(b'<meta charset=koi8-r>') == 'koi8-r'
+    assert prescan(b'<META\tCHARSET = " KOI8-R ">') == 'koi8-r'
+    assert prescan(b"<meta/charset='koi8-r'/>") == 'koi8-r'
+    assert prescan(bytearray(b'<meta charset=koi8-r>')) == 'koi8-r'
+    assert prescan(memoryview(b'<meta charset=koi8-r>')) == 'koi8-r'
+    assert prescan(b'<meta charset=utf-16>') == 'utf-8'
+    assert prescan(b'<meta charset=x-user-defined>') == 'windows-1252'
+    assert prescan(b'<meta charset=invalid><meta charset=koi8-r>') == 'koi8-r'
+    assert prescan(b'<meta charset=koi8-r') is None
+    assert prescan(b'<meta charset="koi8-r>') is None
+    assert prescan(b'<metacharset=koi8-r>') is None
+    assert prescan(b'<meta charset=koi8-r charset=latin1>') == 'koi8-r'
+
+    assert prescan(b'<meta content="text/html; charset=koi8-r">') is None
+    for meta in [
+            b'<meta http-equiv=content-type content="charset=koi8-r">',
+            b'<meta content="text/html;CHARSET = koi8-r;" '
+            b'http-equiv="Content-Type">',
+            b'<meta http-equiv=content-type content="charset=\'koi8-r\'x">',
+            b'<meta http-equiv=content-type content="charset;charset=koi8-r">',
+            b'<meta http-equiv=content-type content=text/html '
+            b'content="charset=latin1" charset=koi8-r>']:
+        assert prescan(meta) == 'koi8-r', meta
+    assert prescan(b'<meta http-equiv=content-type '
+                   b'content="charset=\'koi8-r">') is None
+    assert prescan(b'<meta content="charset=invalid" charset=koi8-r>') \
+        == 'koi8-r'
+    assert prescan(b'<meta charset=koi8-r content="charset=latin1">') \
+        == 'koi8-r'
+    assert prescan(b'<meta content="charset=invalid" http-equiv=content-type '
+                   b'content="charset=koi8-r">') is None
+
+    assert prescan(b'<!-- <meta charset=latin1> --><meta charset=koi8-r>') \
+        == 'koi8-r'
+    assert prescan(b'<!--><meta charset=koi8-r>') == 'koi8-r'
+    assert prescan(b'<!-- <meta charset=latin1>') is None
+    assert prescan(b'<p title="<meta charset=latin1>"><meta charset=koi8-r>') \
+        == 'koi8-r'
+    assert prescan(b'</p x="<meta charset=latin1>"><meta charset=koi8-r>') \
+        == 'koi8-r'
+    assert prescan(b'<?xml <meta charset=latin1>?><meta charset=koi8-r>') \
+        == 'koi8-r'
+    assert prescan(b'<!DOCTYPE html>< 1 <<meta charset=koi8-r>') == 'koi8-r'
+    assert prescan(b' ' * 1010 + b'<meta charset=koi8-r>') is None
+    assert prescan('<?xml'.encode('utf-16le')) == 'utf-16le'
+    assert prescan('<?xml'.encode('utf-16be')) == 'utf-16be'
+
+
+def test_iter_decode_html():
+    def iter_decode_to_string(input, transport_encoding, fallback_encoding):
+        output, encoding = iter_decode_html(
+            input, transport_encoding, fallback_encoding)
+        return ''.join(output), encoding.name
+
+    meta = b'<meta charset=koi8-r>\xc1'
+    assert iter_decode_to_string([], None, 'latin1') == ('', 'windows-1252')
+    assert iter_decode_to_string([meta], None, 'latin1') == (
+        '<meta charset=koi8-r>\u0430', 'koi8-r')
+    assert iter_decode_to_string([meta], 'latin1', 'utf8') == (
+        '<meta charset=koi8-r>\xc1', 'windows-1252')
+    assert iter_decode_to_string([meta], 'invalid', 'latin1') == (
+        '<meta charset=koi8-r>\u0430', 'koi8-r')
+    assert iter_decode_to_string(
+        [b'\xef\xbb', b'\xbf' + meta], lookup('latin1'), 'latin1') == (
+        '<meta charset=koi8-r>\ufffd', 'utf-8')
+    assert iter_decode_to_string([b'<p>\xc1'], None, 'latin1') == (
+        '<p>\xc1', 'windows-1252')
+    assert_raises(LookupError, iter_decode_html, [], None, 'invalid')
+
+    # Only the bytes needed to determine the encoding are read.
+    def chunks():
+        for i in range(100):
+            consumed.append(i)
+            yield meta
+    consumed = []
+    output, encoding = iter_decode_html(chunks(), None, 'latin1')
+    assert encoding.name == 'koi8-r'
+    assert len(consumed) == 1024 // len(meta) + 1
+    assert ''.join(output) == '<meta charset=koi8-r>\u0430' * 100
+    consumed = []
+    output, encoding = iter_decode_html(chunks(), 'utf8', 'latin1')
+    assert consumed == [0]
+
+
 def test_iter_encode():
     assert b''.join(iter_encode([], 'latin1')) == b''
     assert b''.join(iter_encode([''], 'latin1')) == b''
@@ -143,6 +1167,214 @@ def test_iter_encode():
     assert b''.join(iter_encode([
         '', 'h\uF7E9', '', 'llo'], 'x-user-defined')) == b'h\xe9llo'
 
+    assert list(iter_encode([], 'latin1', block_size=2)) == []
+    assert list(iter_encode(['', 'é', 'h', '', 'é', 'llo'], 'utf8',
+                            block_size=3)) == [
+        b'\xc3\xa9h', b'\xc3\xa9l', b'lo']
+    assert list(iter_encode(['héllo'] * 2, 'utf8', block_size=3)) == [
+        b'h\xc3\xa9', b'llo', b'h\xc3\xa9', b'llo']
+    assert list(iter_encode(['h\uF7E9llo'], 'x-user-defined',
+                            block_size=1000)) == [b'h\xe9llo']
+
+
+def test_mkcharmaps():
+    directory = tempfile.mkdtemp()
+    try:
+        with io.open(os.path.join(directory, 'index-iso-8859-8.txt'),
+                     'w', encoding='utf-8') as fd:
+            fd.write('# Comment\n\n'
+                     '0\t0x0080\t\x80 (<control>)\n'
+                     '32\t0x00A0\t\xa0 (NO-BREAK SPACE)\n'
+                     '92\t0x005C\t\\ (REVERSE SOLIDUS)\n'
+                     '127\t0x200F\t\u200f (RIGHT-TO-LEFT MARK)\n')
+        namespace = {}
+        exec(mkcharmaps.generate(directory), namespace)
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    tables = namespace['DECODING_TABLES']
+    assert sorted(tables) == ['iso-8859-8', 'iso-8859-8-i']
+    table = tables['iso-8859-8']
+    assert tables['iso-8859-8-i'] is table
+    assert len(table) == 256
+    assert table[:128] == bytes(bytearray(range(128))).decode('ascii')
+    assert table[128:] == (
+        '\x80' + '\ufffe' * 31 + '\xa0' + '\ufffe' * 59 + '\\' +
+        '\ufffe' * 34 + '\u200f')
+
+    # webencodings.charmaps is up to date with the vendored indexes.
+    package = os.path.dirname(os.path.abspath(__file__))
+    directory = os.path.join(os.path.dirname(package), 'whatwg')
+    if os.path.isdir(directory):  # Not in installed packages.
+        with io.open(os.path.join(package, 'charmaps.py'),
+                     encoding='utf-8') as fd:
+            assert mkcharmaps.generate(directory) == fd.read()
+
+
+def test_mklabels():
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'encodings.json')
+    try:
+        with io.open(filename, 'w') as fd:
+            fd.write(
+                '[{"heading": "The Encoding", "encodings": '
+                '[{"name": "UTF-8", "labels": ["utf-8", "utf8"]}]}, '
+                '{"heading": "Legacy single-byte encodings", "encodings": '
+                '[{"name": "windows-874", "labels": ["tis-620"]}]}, '
+                '{"heading": "Legacy multi-byte Japanese encodings", '
+                '"encodings": [{"name": "ISO-2022-JP", '
+                '"labels": ["csiso2022jp", "iso-2022-jp"]}]}, '
+                '{"heading": "Legacy miscellaneous encodings", "encodings": '
+                '[{"name": "x-user-defined", "labels": ["x-user-defined"]}, '
+                '{"name": "replacement", "labels": ["iso-2022-kr"]}, '
+                '{"name": "UTF-16LE", "labels": ["utf-16"]}]}]')
+        namespace = {}
+        exec(mklabels.generate(filename), namespace)
+        # Encodings added to the standard later
+        # are not assumed to be ASCII-compatible.
+        with io.open(filename, 'w') as fd:
+            fd.write('[{"heading": "Future encodings", "encodings": '
+                     '[{"name": "UTF-7", "labels": ["utf-7"]}]}]')
+        future = {}
+        exec(mklabels.generate(filename), future)
+        assert future['ASCII_COMPATIBLE'] == set()
+    finally:
+        os.remove(filename)
+        os.rmdir(directory)
+    assert namespace['LABELS'] == {
+        'utf-8': 'utf-8', 'utf8': 'utf-8', 'tis-620': 'windows-874',
+        'csiso2022jp': 'iso-2022-jp', 'iso-2022-jp': 'iso-2022-jp',
+        'x-user-defined': 'x-user-defined', 'iso-2022-kr': 'replacement',
+        'utf-16': 'utf-16le'}
+    assert namespace['BYTES_LABELS'] == dict(
+        (label.encode('ascii'), name)
+        for label, name in namespace['LABELS'].items())
+    assert namespace['NAME_LABELS'] == {
+        'utf-8': ('utf-8', 'utf8'), 'windows-874': ('tis-620',),
+        'iso-2022-jp': ('csiso2022jp', 'iso-2022-jp'),
+        'x-user-defined': ('x-user-defined',),
+        'replacement': ('iso-2022-kr',), 'utf-16le': ('utf-16',)}
+    assert namespace['ASCII_COMPATIBLE'] == set([
+        'utf-8', 'windows-874', 'x-user-defined'])
+    assert namespace['SINGLE_BYTE'] == set(['windows-874', 'x-user-defined'])
+    assert namespace['STATEFUL'] == set(['iso-2022-jp'])
+    assert namespace['PYTHON_NAMES'] == {
+        'utf-8': 'utf-8', 'windows-874': 'cp874', 'iso-2022-jp': 'iso2022_jp',
+        'utf-16le': 'utf-16-le'}
+    # Every name has a codec, even those without a Python codec.
+    try:
+        for name in set(namespace['LABELS'].values()):
+            assert _encoding_from_name(name).name == name
+    finally:
+        # Not in LABELS: do not leave it for test_preload().
+        CACHE.pop('replacement', None)
+
+
+def test_labels_tables():
+    names = set(LABELS.values())
+    assert labels.BYTES_LABELS == dict(
+        (label.encode('ascii'), name) for label, name in LABELS.items())
+    assert set(labels.NAME_LABELS) == names
+    for name, name_labels in labels.NAME_LABELS.items():
+        assert all(LABELS[label] == name for label in name_labels)
+    assert sum(map(len, labels.NAME_LABELS.values())) == len(LABELS)
+    assert labels.SINGLE_BYTE <= labels.ASCII_COMPATIBLE <= names
+    assert not labels.STATEFUL & labels.ASCII_COMPATIBLE
+    assert set(labels.PYTHON_NAMES) == names - set(
+        ['replacement', 'x-user-defined'])
+    for name in labels.SINGLE_BYTE:
+        assert len(encode('a\xa0', name, 'replace')) == 2
+    ascii = bytes(bytearray(range(128)))
+    for name in labels.ASCII_COMPATIBLE:
+        assert decode(ascii, name, 'strict')[0] == ascii.decode('ascii')
+
+
+def test_single_byte():
+    # windows-1252 maps the bytes that Python's cp1252 does not
+    # to C1 controls, and this table leaves byte 0xFF unmapped.
+    table = ''.join(
+        bytes(bytearray([byte])).decode('cp1252', 'ignore') or
+        bytes(bytearray([byte])).decode('latin1')
+        for byte in range(255)) + '\ufffe'
+    codec_info = single_byte.codec_info('windows-1252', table)
+    input = b'caf\xe9 \x80\x81\x8d\x8f\x90\x9d'
+    output = 'café €\x81\x8d\x8f\x90\x9d'
+    assert codec_info.decode(input) == (output, len(input))
+    assert codec_info.encode(output) == (input, len(output))
+    assert codec_info.decode(b'a\xff', 'replace') == ('a\ufffd', 2)
+    assert_raises(UnicodeDecodeError, codec_info.decode, b'a\xff')
+    assert codec_info.encode('a\xff', 'replace') == (b'a?', 2)
+    assert_raises(UnicodeEncodeError, codec_info.encode, 'a\u0100')
+    decoder = codec_info.incrementaldecoder()
+    assert decoder.decode(input[:4]) + decoder.decode(input[4:], True) == (
+        output)
+    encoder = codec_info.incrementalencoder()
+    assert encoder.encode(output[:4]) + encoder.encode(output[4:], True) == (
+        input)
+
+    # Where the WHATWG indexes differ from the Python codecs.
+    assert decode(b'\x80\x81\x8d', 'windows-1252') == (
+        '\u20ac\x81\x8d', lookup('windows-1252'))
+    assert encode('\x81', 'latin1') == b'\x81'
+    assert decode(b'\xae\xbe', 'koi8-u')[0] == '\u045e\u040e'
+    assert decode(b'\x81\xdb', 'windows-874')[0] == '\x81\ufffd'
+    assert decode(b'\xff', 'x-mac-cyrillic')[0] == '\u20ac'
+
+    # The generated tables are used by lookup(),
+    # and match the vendored WHATWG indexes.
+    tables = charmaps.DECODING_TABLES
+    assert set(tables) == labels.SINGLE_BYTE - set(['x-user-defined'])
+    assert tables['iso-8859-8-i'] is tables['iso-8859-8']
+    directory = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'whatwg')
+    all_bytes = bytes(bytearray(range(256)))
+    for name, table in tables.items():
+        assert len(table) == 256
+        assert table[:128] == all_bytes[:128].decode('ascii')
+        if os.path.isdir(directory):  # Not in installed packages.
+            index = mkcharmaps.read_index(os.path.join(
+                directory, 'index-%s.txt' % mkcharmaps.SHARED_INDEXES.get(
+                    name, name)))
+            assert table[128:] == ''.join(
+                '\ufffe' if code_point is None else '%c' % code_point
+                for code_point in index)
+        encoding = lookup(name)
+        assert decode(all_bytes, encoding)[0] == table.replace(
+            '\ufffe', '\ufffd')
+        mapped = table.replace('\ufffe', '')
+        assert decode(encode(mapped, encoding), encoding)[0] == mapped
+
+
+def test_replacement():
+    encoding = Encoding('replacement', replacement.codec_info)
+    assert decode(b'', encoding) == ('', encoding)
+    assert decode(b'\x1b$)Cabc', encoding) == ('\ufffd', encoding)
+    assert decode(b'\xef\xbb\xbfabc', encoding) == ('abc', UTF8)
+    assert decode(b'abc', encoding, 'ignore') == ('', encoding)
+    assert_raises(UnicodeDecodeError, decode, b'abc', encoding, 'strict')
+    assert encode('caf\xe9', encoding) == b'caf\xc3\xa9'
+    report = DecodeReport()
+    assert decode(b'abc', encoding, report=report)[0] == '\ufffd'
+    assert report.error_count == 1
+
+    decoder = IncrementalDecoder(encoding)
+    assert decoder.decode(b'ab') == ''  # Waiting for a possible BOM.
+    assert decoder.decode(b'cd') == '\ufffd'
+    assert decoder.decode(b'') == ''
+    assert decoder.decode(b'efg', final=True) == ''
+    decoder.reset()
+    assert decoder.decode(b'abcd', final=True) == '\ufffd'
+    codec_decoder = replacement.codec_info.incrementaldecoder('replace')
+    assert codec_decoder.decode(b'a') == '\ufffd'
+    assert codec_decoder.getstate() == (b'', 1)
+    assert codec_decoder.decode(b'b') == ''
+    codec_decoder.setstate((b'', 0))
+    assert codec_decoder.decode(b'b') == '\ufffd'
+    assert ''.join(iter_decode([b'', b'abc', b'def'], encoding)[0]) == (
+        '\ufffd')
+
 
 def test_x_user_defined():
     encoded = b'2,\x0c\x0b\x1aO\xd9#\xcb\x0f\xc9\xbbt\xcf\xa8\xca'
@@ -151,3 +1383,20 @@ def test_x_user_defined():
     decoded = 'aa'
     assert decode(encoded, 'x-user-defined') == (decoded, lookup('x-user-defined'))
     assert encode(decoded, 'x-user-defined') == encoded
+
+    codec_info = lookup('x-user-defined').codec_info
+    encoded = bytes(bytearray(range(256)))
+    decoded = bytes(bytearray(
+        half for byte in range(256)
+        for half in [byte, 0xF7 if byte >= 0x80 else 0])).decode('utf-16-le')
+    for input in [encoded, bytearray(encoded), memoryview(encoded)]:
+        assert codec_info.decode(input) == (decoded, 256)
+        assert codec_info.decode(input[:128]) == (decoded[:128], 128)
+    assert codec_info.encode(decoded) == (encoded, 256)
+    assert codec_info.encode(decoded[:128]) == (encoded[:128], 128)
+    assert codec_info.incrementaldecoder().decode(encoded) == decoded
+    assert codec_info.incrementalencoder().encode(decoded) == encoded
+    for unmapped in ['\xe9', '\uf741', '\uf800', '\ud83d', '\U0001f600']:
+        assert_raises(UnicodeEncodeError, codec_info.encode, 'a' + unmapped)
+        assert codec_info.encode('a%s\uf7e9' % unmapped, 'replace') == (
+            b'a' + b'?' * len(unmapped) + b'\xe9', len(unmapped) + 2)
@@ -18,23 +18,41 @@ import codecs
 
 ### Codec APIs
 
+# 0x00 to 0x7F map to U+0000 to U+007F, so all-ASCII input goes through
+# the ASCII codec, which is an order of magnitude faster than the tables.
+# For decoding, webencodings.decode() and IncrementalDecoder already do that.
+# 0x80 to 0xFF map to U+F780 to U+F7FF. Doing that arithmetic with other
+# codecs (such as interleaving the bytes with 0x00 or 0xF7 and decoding
+# as UTF-16, or the reverse) was measured slower than the tables.
+
+def encode(input, errors='strict'):
+    isascii = getattr(input, 'isascii', None)  # Python 3.7+
+    if isascii is not None and isascii():
+        return input.encode('ascii'), len(input)
+    return codecs.charmap_encode(input, errors, encoding_table)
+
+
+def decode(input, errors='strict'):
+    return codecs.charmap_decode(input, errors, decoding_table)
+
+
 class Codec(codecs.Codec):
 
     def encode(self, input, errors='strict'):
-        return codecs.charmap_encode(input, errors, encoding_table)
+        return encode(input, errors)
 
     def decode(self, input, errors='strict'):
-        return codecs.charmap_decode(input, errors, decoding_table)
+        return decode(input, errors)
 
 
 class IncrementalEncoder(codecs.IncrementalEncoder):
     def encode(self, input, final=False):
-        return codecs.charmap_encode(input, self.errors, encoding_table)[0]
+        return encode(input, self.errors)[0]
 
 
 class IncrementalDecoder(codecs.IncrementalDecoder):
     def decode(self, input, final=False):
-        return codecs.charmap_decode(input, self.errors, decoding_table)[0]
+        return decode(input, self.errors)[0]
 
 
 class StreamWriter(Codec, codecs.StreamWriter):